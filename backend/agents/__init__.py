@@ -1,7 +1,18 @@
-from agents.welcome_agent import WelcomeAgent
-from agents.research_agent import ResearchAgent
-from agents.copywriter_agent import CopywriterAgent
-from agents.project_agent import ProjectAgent
+import importlib
 
-# Export all agents
-__all__ = ['WelcomeAgent', 'ResearchAgent', 'CopywriterAgent', 'ProjectAgent']
\ No newline at end of file
+# Export all agents. They are imported on first access, so tools that only need
+# one module (e.g. agents.project_catalog) don't pay for the LLM client and ddgs.
+__all__ = ['WelcomeAgent', 'ResearchAgent', 'CopywriterAgent', 'ProjectAgent']
+
+_MODULES = {
+    'WelcomeAgent': 'agents.welcome_agent',
+    'ResearchAgent': 'agents.research_agent',
+    'CopywriterAgent': 'agents.copywriter_agent',
+    'ProjectAgent': 'agents.project_agent',
+}
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,134 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+AUDIENCES = ("client", "designer", "developer", "other")
+
+# Stems are matched as token prefixes so Russian/Ukrainian inflections
+# ("дизайнера", "розробником") hit the same entry; stems of SHORT_STEM letters
+# or fewer ("ui", "git") only match a whole token. Role nouns weigh the most:
+# "I'm a designer" is a much stronger signal than a mention of Figma.
+ROLE_STEMS = {
+    "client": [
+        "client", "customer", "founder", "cofounder", "ceo", "cto", "owner", "entrepreneur",
+        "клиент", "заказчик", "основател", "владел", "предпринимател",
+        "клієнт", "замовник", "засновник", "власник", "підприємц",
+    ],
+    "designer": [
+        "designer", "дизайнер", "illustrator", "иллюстратор", "ілюстратор",
+    ],
+    "developer": [
+        "developer", "programmer", "engineer", "coder", "devops",
+        "разработчик", "программист", "инженер", "розробник", "програміст", "інженер",
+    ],
+    "other": [
+        "student", "journalist", "recruiter", "студент", "журналист", "журналіст", "рекрутер",
+    ],
+}
+
+TOPIC_STEMS = {
+    "client": [
+        "budget", "cost", "price", "pricing", "quote", "hire", "outsourc", "business", "startup",
+        "company", "launch", "deadline", "estimate", "contract", "roi", "revenue", "mvp",
+        "бюджет", "стоимост", "цена", "цену", "цены", "заказ", "бизнес", "стартап", "компани", "срок",
+        "вартіст", "ціна", "ціну", "замови", "бізнес", "компані", "строк",
+    ],
+    "designer": [
+        "design", "figma", "dribbble", "behance", "ui", "ux", "typograph", "font", "color",
+        "colour", "layout", "wirefram", "prototyp", "brand", "illustrat", "animation", "visual",
+        "дизайн", "макет", "шрифт", "цвет", "брендинг", "прототип", "визуал",
+        "колір", "кольор", "візуал",
+    ],
+    "developer": [
+        "code", "coding", "react", "vue", "nextjs", "node", "javascript", "typescript", "frontend",
+        "backend", "fullstack", "api", "apis", "stack", "framework", "library", "deploy", "git",
+        "database", "jamstack", "cms", "webflow", "testing", "cypress", "jest", "aws", "azure",
+        "разработк", "код", "кода", "коду", "кодом", "фреймворк", "технолог", "бэкенд", "фронтенд", "стек",
+        "розробк", "бекенд", "фронтенд", "технолог",
+    ],
+    "other": [
+        "career", "vacanc", "job", "jobs", "intern", "study", "learn",
+        "карьер", "вакан", "стаж", "учеб",
+        "кар'єр", "навчан",
+    ],
+}
+
+ROLE_WEIGHT = 3.0
+TOPIC_WEIGHT = 1.0
+SEED_WEIGHT = 0.5
+MIN_STEM = 2
+SHORT_STEM = 3
+
+TOKEN_RE = re.compile(r"[\w'+#.]+", re.UNICODE)
+
+
+class AudienceClassifier:
+    """Local client/designer/developer/other classifier.
+
+    Scores a message by summing weighted stem hits: hand-picked role and topic
+    stems in en/ru/uk plus words that are distinctive for a single audience in
+    welcome.json. Returns (audience, confidence) in microseconds, so the LLM is
+    only needed when nothing in the message points anywhere.
+    """
+
+    def __init__(self, company_data=None, min_confidence=0.6, min_score=1.0):
+        self.min_confidence = min_confidence
+        self.min_score = min_score
+        self.stems = {}
+        self._add_seed_terms(company_data or {})
+        for stems, weight in ((TOPIC_STEMS, TOPIC_WEIGHT), (ROLE_STEMS, ROLE_WEIGHT)):
+            for audience, words in stems.items():
+                for word in words:
+                    self.stems[word] = (audience, weight)
+        self.max_stem = max((len(stem) for stem in self.stems), default=0)
+        self.classify = lru_cache(maxsize=4096)(self._classify)
+
+    def _add_seed_terms(self, company_data):
+        """Add words from welcome.json that occur in exactly one audience section."""
+        seen = defaultdict(set)
+        for audience, data in company_data.items():
+            if audience not in AUDIENCES:
+                continue
+            texts = [data.get("intro", "")]
+            for field in ("key_points", "services", "achievements"):
+                texts.extend(data.get(field, []))
+            for text in texts:
+                for token in self._tokenize(text):
+                    if len(token) > 3 and not token[0].isdigit():
+                        seen[token].add(audience)
+        for token, audiences in seen.items():
+            if len(audiences) == 1:
+                self.stems[token] = (next(iter(audiences)), SEED_WEIGHT)
+
+    def _tokenize(self, text):
+        return [token.strip(".") for token in TOKEN_RE.findall(text.lower())]
+
+    def _match(self, token):
+        # Longest stem that prefixes the token wins. Short stems must be the whole
+        # token, or "цен" would match "центр" and "api" "apiary".
+        for size in range(min(len(token), self.max_stem), MIN_STEM - 1, -1):
+            if size <= SHORT_STEM and size < len(token):
+                break
+            hit = self.stems.get(token[:size])
+            if hit:
+                return hit
+        return None
+
+    def scores(self, text):
+        totals = dict.fromkeys(AUDIENCES, 0.0)
+        for token in self._tokenize(text):
+            hit = self._match(token)
+            if hit:
+                totals[hit[0]] += hit[1]
+        return totals
+
+    def _classify(self, text):
+        totals = self.scores(text)
+        best = max(totals, key=totals.get)
+        total = sum(totals.values())
+        if totals[best] < self.min_score:
+            return best if total else "other", 0.0
+        return best, totals[best] / total
+
+    def is_confident(self, confidence):
+        return confidence >= self.min_confidence
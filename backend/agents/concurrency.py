@@ -0,0 +1,28 @@
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+_io_executor = None
+
+
+def get_io_executor():
+    """Thread pool for blocking I/O (DDGS, image APIs) called from async code."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("ASYNC_IO_THREADS", 64)),
+            thread_name_prefix="agents-io",
+        )
+    return _io_executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared I/O pool without stalling the event loop.
+
+    The call sees the caller's context variables (request timing, served models).
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_io_executor(), call)
@@ -1,26 +1,45 @@
 import os
-import requests
 import re
-from ddgs import DDGS
-from lingua import Language, LanguageDetectorBuilder
-from .get_images import get_images
+import json
+import asyncio
+import contextvars
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from .image_injector import StreamingImageInjector
+from .web_search import get_web_search
+from .llm_client import get_llm_client, get_async_llm_client
+from .language import detect_language
+from .concurrency import run_blocking
+from .history import compact_history, messages_tokens
+
+JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+CODE_FENCE = re.compile(r'^```[a-z]*\s*|\s*```$')
+
+MODES = ("single", "sections")
+# Share of the article taken by the summary and conclusion in sections mode.
+FRAME_SHARE = 0.15
 
 class CopywriterAgent:
     def __init__(self, default_model="llama3-8b-8192"):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.default_model = default_model
-        self.language_detector = LanguageDetectorBuilder.from_languages(
-            Language.ENGLISH, Language.RUSSIAN, Language.UKRAINIAN
-        ).build()
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
+        self.llm = get_llm_client()
+        self.mode = os.getenv("COPYWRITER_MODE", "single")
+        self.section_chars = int(os.getenv("COPYWRITER_SECTION_CHARS", 1500))
+        self.section_concurrency = int(os.getenv("COPYWRITER_SECTION_CONCURRENCY", 4))
+        self.image_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IMAGE_LOOKUP_CONCURRENCY", 4)),
+            thread_name_prefix="image-lookup",
+        )
+        self.section_executor = ThreadPoolExecutor(
+            max_workers=self.section_concurrency,
+            thread_name_prefix="copywriter-section",
+        )
 
     def _detect_language(self, text):
-        try:
-            lang = self.language_detector.detect_language_of(text)
-            return lang.iso_code_639_1.name.lower()
-        except:
-            return "en"
+        return detect_language(text)
 
     def _clean_text(self, text):
         if not text:
@@ -28,12 +47,7 @@ class CopywriterAgent:
         return " ".join(text.replace('\n', ' ').strip().split())
 
     def _web_search(self, query, max_results=10):
-        try:
-            with DDGS(timeout=20) as ddgs:
-                return list(ddgs.text(query, max_results=max_results))
-        except Exception as e:
-            print(f"Search error: {str(e)}")
-            return []
+        return get_web_search().search(query, max_results=max_results, timeout=20)
 
     def _format_results(self, results):
         if not results:
@@ -43,9 +57,8 @@ class CopywriterAgent:
             for r in results
         )
 
-    def write_article(self, topic, length=5000, tone="neutral", audience="general public", chat_history=None):
+    def _build_messages(self, topic, length, tone, audience, chat_history, search_results, model):
         lang = self._detect_language(topic)
-        search_results = self._web_search(topic, max_results=5)
         formatted_results = self._format_results(search_results)
 
         token_goal = int(length / 4)
@@ -82,69 +95,370 @@ class CopywriterAgent:
             f"Use <!--IMAGE_KEYWORDS: ... --> and <!--IMAGE_HERE--> for image placeholders.\n"
         )
 
-        messages = []
+        # System prompt first: history placed before it weakens the instructions.
+        messages = [{"role": "system", "content": system_prompt}]
         if chat_history:
-            messages.extend(chat_history)
+            reserved = messages_tokens(messages) + messages_tokens([{"content": user_prompt}]) + max_tokens
+            messages.extend(compact_history(chat_history, model, reserved)[0])
+
+        messages.append({"role": "user", "content": user_prompt})
+        return messages, max_tokens
 
-        messages.append({"role": "system", "content": system_prompt})
+    def _error_article(self, error):
+        return (
+            "<article>"
+            "<h1>Error Generating Content</h1>"
+            "<p>Sorry, I couldn't generate the article. Please try again later.</p>"
+            f"<p>Technical details: {str(error)[:200]}</p>"
+            "</article>"
+        )
+
+    def _section_plan(self, length, section_length=None):
+        """(number of sections, characters per section) for an article of `length` characters.
+
+        section_length only picks the number of sections (2 to 8); the body is
+        then split evenly between them, so the plan adds up to `length`.
+        """
+        section_length = max(300, min(4000, int(section_length or self.section_chars)))
+        body = length * (1 - FRAME_SHARE)
+        count = max(2, min(8, round(body / section_length)))
+        return count, int(body / count)
+
+    def _outline_messages(self, topic, length, tone, audience, chat_history, search_results, model, count):
+        lang = self._detect_language(topic)
+        frame_chars = int(length * FRAME_SHARE / 2)
+        max_tokens = 300 + count * 80 + frame_chars // 2
+
+        system_prompt = (
+            f"You are a professional copywriter for a Gen-Z audience planning an in-depth article on '{topic}'.\n"
+            f"Write in the user's language ({lang}) with a {tone} tone for a {audience} audience.\n"
+            "Return ONLY a JSON object of this shape:\n"
+            '{"title": "...", "summary": "...", "sections": [{"title": "...", "points": ["...", "..."]}], "conclusion": "..."}\n'
+            f"- \"sections\": EXACTLY {count} distinct, non-overlapping sections, each with 2-4 points to cover.\n"
+            f"- \"summary\": the opening paragraph, about {frame_chars} characters.\n"
+            f"- \"conclusion\": the closing paragraph, about {frame_chars} characters.\n"
+            "- Plain text only, no HTML.\n\n"
+            f"**Reference Materials**:\n{self._format_results(search_results)}"
+        )
+        user_prompt = f"Outline an article about: {topic}"
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if chat_history:
+            reserved = messages_tokens(messages) + messages_tokens([{"content": user_prompt}]) + max_tokens
+            messages.extend(compact_history(chat_history, model, reserved)[0])
         messages.append({"role": "user", "content": user_prompt})
+        return messages, max_tokens
 
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        payload = {
-            "model": self.default_model,
-            "messages": messages,
-            "temperature": 0.8,
-            "max_tokens": max_tokens
-        }
+    def _parse_outline(self, text):
+        """Outline dict from the model's reply, or None when it has no usable sections."""
+        match = JSON_OBJECT.search(text or "")
+        if not match:
+            return None
+        try:
+            outline = json.loads(match.group(0))
+        except ValueError:
+            return None
+        sections = [
+            section for section in outline.get("sections") or []
+            if isinstance(section, dict) and section.get("title")
+        ]
+        if not sections:
+            return None
+        return dict(outline, sections=sections)
+
+    def _section_messages(self, topic, tone, audience, search_results, outline, index, section_length):
+        lang = self._detect_language(topic)
+        section = outline["sections"][index]
+        points = "; ".join(str(point) for point in section.get("points") or [])
+        plan = "\n".join(f"{i + 1}. {s['title']}" for i, s in enumerate(outline["sections"]))
+        max_tokens = min(4000, section_length // 3 + 300)
+
+        system_prompt = (
+            f"You are a professional copywriter for a Gen-Z audience. Your goal is to entertain and educate.\n"
+            f"You are writing ONE section of an HTML article titled '{outline.get('title') or topic}' about '{topic}', in the user's language ({lang}).\n"
+            f"**Article Outline**:\n{plan}\n\n"
+            f"**Your Section**: {index + 1}. {section['title']}\n"
+            f"**Cover**: {points}\n"
+            f"**Tone Requirements**: Keep a {tone} tone throughout.\n"
+            f"**Audience Requirements**: Tailor complexity, references and examples to a {audience} audience.\n"
+            f"NEVER include words or phrases in languages other than the user's language (detected as {lang}), except for terms.\n\n"
+            f"**Length**: STRICTLY {section_length} characters (±10%)\n"
+            f"**Token Limit**: {max_tokens} tokens\n\n"
+            "**Structure Requirements**:\n"
+            "1. Output a single <section> that starts with an <h2> subtitle.\n"
+            "2. Use ONLY these HTML tags: <section>, <h2>-<h6>, <p>, <span>, <ul>, <ol>, <li>, <blockquote>.\n"
+            "3. Include 1 or 2 image placeholders, each with EXACTLY 3 single-word English keywords:\n"
+            "   <!--IMAGE_KEYWORDS: keyword1, keyword2, keyword3-->\n"
+            "   <!--IMAGE_HERE-->\n"
+            "4. Do not repeat other sections, and write no introduction or conclusion for the article.\n\n"
+            f"**Reference Materials**:\n{self._format_results(search_results)}\n"
+            "**Important**:\n"
+            "- Keywords MUST be in English\n"
+            "- Output ONLY the HTML section"
+        )
+        user_prompt = f"Write section {index + 1} of {len(outline['sections'])}: {section['title']}."
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}], max_tokens
+
+    def _article_head(self, topic, outline):
+        head = f"<article>\n<h1>{escape(outline.get('title') or topic)}</h1>\n"
+        if outline.get("summary"):
+            head += f"<p>{escape(str(outline['summary']))}</p>\n"
+        return head
+
+    def _article_tail(self, outline):
+        tail = ""
+        if outline.get("conclusion"):
+            tail += f"<p>{escape(str(outline['conclusion']))}</p>\n"
+        return tail + "</article>"
+
+    def _clean_section(self, text):
+        return CODE_FENCE.sub("", (text or "").strip()) + "\n"
 
+    def _outline(self, topic, length, tone, audience, chat_history, search_results, model, count):
+        messages, max_tokens = self._outline_messages(topic, length, tone, audience, chat_history, search_results, model, count)
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=45
+            text = self.llm.complete(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=20,
+                temperature=0.5,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
             )
-            response.raise_for_status()
-            html = response.json()["choices"][0]["message"]["content"]
         except Exception as e:
-            return (
-                "<article>"
-                "<h1>Error Generating Content</h1>"
-                "<p>Sorry, I couldn't generate the article. Please try again later.</p>"
-                f"<p>Technical details: {str(e)[:200]}</p>"
-                "</article>"
+            print(f"Outline error: {str(e)}")
+            return None
+        return self._parse_outline(text)
+
+    async def _aoutline(self, topic, length, tone, audience, chat_history, search_results, model, count):
+        messages, max_tokens = self._outline_messages(topic, length, tone, audience, chat_history, search_results, model, count)
+        try:
+            text = await get_async_llm_client().complete(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=20,
+                temperature=0.5,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
             )
+        except Exception as e:
+            print(f"Outline error: {str(e)}")
+            return None
+        return self._parse_outline(text)
+
+    def _write_section(self, topic, tone, audience, search_results, outline, index, section_length, model):
+        messages, max_tokens = self._section_messages(topic, tone, audience, search_results, outline, index, section_length)
+        try:
+            text = self.llm.complete(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=45,
+                temperature=0.8,
+                max_tokens=max_tokens
+            )
+        except Exception as e:
+            print(f"Section {index + 1} error: {str(e)}")
+            return ""
+        return self._clean_section(text)
+
+    async def _awrite_section(self, topic, tone, audience, search_results, outline, index, section_length, model):
+        messages, max_tokens = self._section_messages(topic, tone, audience, search_results, outline, index, section_length)
+        try:
+            text = await get_async_llm_client().complete(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=45,
+                temperature=0.8,
+                max_tokens=max_tokens
+            )
+        except Exception as e:
+            print(f"Section {index + 1} error: {str(e)}")
+            return ""
+        return self._clean_section(text)
+
+    def _submit_sections(self, topic, tone, audience, search_results, outline, section_length, model):
+        """Start every section on the section pool; futures are in document order."""
+        return [
+            # Each task runs in a copy of this context so served models are still recorded.
+            self.section_executor.submit(
+                contextvars.copy_context().run, self._write_section,
+                topic, tone, audience, search_results, outline, index, section_length, model
+            )
+            for index in range(len(outline["sections"]))
+        ]
+
+    def _section_parts(self, topic, tone, audience, search_results, outline, section_length, model):
+        """Yield the article head, each written section in document order as soon as it is ready, then the tail."""
+        futures = self._submit_sections(topic, tone, audience, search_results, outline, section_length, model)
+        try:
+            yield self._article_head(topic, outline)
+            written = 0
+            for future in futures:
+                section = future.result()
+                if section:
+                    written += 1
+                    yield section
+            if not written:
+                raise RuntimeError("No section of the article could be generated")
+            yield self._article_tail(outline)
+        finally:
+            # A client that went away mid-article must not leave queued sections to run.
+            for future in futures:
+                future.cancel()
+
+    async def _asection_parts(self, topic, tone, audience, search_results, outline, section_length, model):
+        """Async generator version of _section_parts(); at most section_concurrency sections run at once."""
+        semaphore = asyncio.Semaphore(self.section_concurrency)
+
+        async def write(index):
+            async with semaphore:
+                return await self._awrite_section(topic, tone, audience, search_results, outline, index, section_length, model)
+
+        tasks = [asyncio.ensure_future(write(index)) for index in range(len(outline["sections"]))]
+        try:
+            yield self._article_head(topic, outline)
+            written = 0
+            for task in tasks:
+                section = await task
+                if section:
+                    written += 1
+                    yield section
+            if not written:
+                raise RuntimeError("No section of the article could be generated")
+            yield self._article_tail(outline)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def write_article(self, topic, length=5000, tone="neutral", audience="general public", chat_history=None, model=None,
+                      mode=None, section_length=None):
+        """Generate the article as HTML with images.
+
+        mode "single" writes it in one completion; "sections" outlines it
+        first and writes sections of section_length characters concurrently,
+        so a long article takes about as long as its slowest section.
+        """
+        model = model or self.default_model
+        search_results = self._web_search(topic, max_results=5)
+        # The completion is streamed so image lookups start while it is written.
+        injector = StreamingImageInjector(self.image_executor)
+        if self._mode(mode) == "sections":
+            count, section_length = self._section_plan(length, section_length)
+            outline = self._outline(topic, length, tone, audience, chat_history, search_results, model, count)
+            if outline is not None:
+                try:
+                    for part in self._section_parts(topic, tone, audience, search_results, outline, section_length, model):
+                        injector.feed(part)
+                except Exception as e:
+                    return self._error_article(e)
+                return injector.finish()
+
+        messages, max_tokens = self._build_messages(topic, length, tone, audience, chat_history, search_results, model)
+
+        try:
+            for chunk in self.llm.stream(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=45,
+                temperature=0.8,
+                max_tokens=max_tokens
+            ):
+                injector.feed(chunk)
+        except Exception as e:
+            return self._error_article(e)
+
+        return injector.finish()
+
+    async def awrite_article(self, topic, length=5000, tone="neutral", audience="general public", chat_history=None, model=None,
+                             mode=None, section_length=None):
+        """Non-blocking write_article for the ASGI app; search and image lookups run on the shared I/O pool."""
+        model = model or self.default_model
+        search_results = await run_blocking(self._web_search, topic, max_results=5)
+        injector = StreamingImageInjector(self.image_executor)
+        if self._mode(mode) == "sections":
+            count, section_length = self._section_plan(length, section_length)
+            outline = await self._aoutline(topic, length, tone, audience, chat_history, search_results, model, count)
+            if outline is not None:
+                try:
+                    async for part in self._asection_parts(topic, tone, audience, search_results, outline, section_length, model):
+                        injector.feed(part)
+                except Exception as e:
+                    return self._error_article(e)
+                return await run_blocking(injector.finish)
+
+        messages, max_tokens = self._build_messages(topic, length, tone, audience, chat_history, search_results, model)
+
+        try:
+            async for chunk in get_async_llm_client().stream(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=45,
+                temperature=0.8,
+                max_tokens=max_tokens
+            ):
+                injector.feed(chunk)
+        except Exception as e:
+            return self._error_article(e)
+
+        return await run_blocking(injector.finish)
+
+    def stream_article(self, topic, length=5000, tone="neutral", audience="general public", chat_history=None, model=None,
+                       mode=None, section_length=None):
+        """Yield raw ("token", html) events while the article is generated.
+
+        Image lookups start as soon as each placeholder's keywords have
+        streamed in; the final ("done", meta) event carries the complete
+        article with images in meta["response"]. In sections mode each
+        section is sent whole, in document order, as soon as it and the
+        ones before it are written.
+        """
+        model = model or self.default_model
+        search_results = self._web_search(topic, max_results=5)
+        injector = StreamingImageInjector(self.image_executor)
+        parts = None
+        if self._mode(mode) == "sections":
+            count, section_length = self._section_plan(length, section_length)
+            outline = self._outline(topic, length, tone, audience, chat_history, search_results, model, count)
+            if outline is not None:
+                parts = self._section_parts(topic, tone, audience, search_results, outline, section_length, model)
+
+        if parts is None:
+            messages, max_tokens = self._build_messages(topic, length, tone, audience, chat_history, search_results, model)
+            parts = self.llm.stream(
+                messages,
+                model=model,
+                cache="copywriter",
+                priority="bulk",
+                timeout=45,
+                temperature=0.8,
+                max_tokens=max_tokens
+            )
+
+        try:
+            for chunk in parts:
+                injector.feed(chunk)
+                yield "token", chunk
+        except Exception as e:
+            yield "error", {"error": str(e), "response": self._error_article(e)}
+            return
+        finally:
+            # On a disconnect (GeneratorExit) this stops the sections or the upstream stream now.
+            parts.close()
+
+        yield "done", {"response": injector.finish()}
 
-        return self._inject_images(html)
-
-    def _inject_images(self, html: str) -> str:        
-        pattern = r'<!--IMAGE_KEYWORDS:([^-]+?)-->\s*<!--IMAGE_HERE-->'
-        used_urls = set()
-        new_html = html
-       
-        matches = list(re.finditer(pattern, html, re.DOTALL))
-        
-        for match in matches:
-            full_match = match.group(0)
-            keywords_str = match.group(1).strip()
-         
-            keywords = [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
-            if not keywords:
-                continue
-                     
-            img_options = get_images(keywords, per_page=5) if keywords else []            
-           
-            selected_url = None
-            for url in img_options:
-                if url not in used_urls:
-                    selected_url = url
-                    used_urls.add(url)
-                    break
-           
-            if selected_url:
-                img_tag = f'<img src="{selected_url}" width="600" height="400" alt="{keywords_str}">'
-                new_html = new_html.replace(full_match, img_tag, 1)
-            else:                
-                new_html = new_html.replace(full_match, "<!--IMAGE_NOT_FOUND-->", 1)
-        
-        return new_html
+    def _mode(self, mode):
+        mode = mode or self.mode
+        return mode if mode in MODES else "single"
@@ -0,0 +1,100 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Keeps figures like "4.9/5", "€1.4m", "+35%" or "ci/cd" in one token.
+TOKEN_RE = re.compile(r"[\w'+#%€$./-]+", re.UNICODE)
+TRIM = ".,:;/-'"
+TRIGGER_WORDS = 3
+
+
+def tokenize(text):
+    """Lowercased tokens of text, plus the parts of compounds such as "ux/ui"."""
+    tokens = set()
+    for token in TOKEN_RE.findall(text.lower()):
+        token = token.strip(TRIM)
+        if not token:
+            continue
+        tokens.add(token)
+        if "/" in token or "-" in token:
+            tokens.update(part for part in re.split(r"[/-]", token) if part)
+    return tokens
+
+
+class FactMatcher:
+    """Tracks which welcome.json facts the assistant has already brought up.
+
+    A fact counts as mentioned when an assistant message contains one of the
+    first words of the fact. Those trigger words are indexed once, so a
+    message is matched with a single tokenize pass and set lookups instead of
+    a substring scan per fact. Results are kept per conversation prefix,
+    keyed by a hash chain over the assistant messages, so each turn only
+    scans the messages that are new since the previous request.
+    """
+
+    def __init__(self, company_data=None, cache_size=None):
+        self.facts = []
+        self.triggers = {}
+        seen = set()
+        for audience in (company_data or {}).values():
+            for fact in audience.get("key_points", []) + audience.get("achievements", []):
+                if fact in seen:
+                    continue
+                seen.add(fact)
+                fact_id = len(self.facts)
+                self.facts.append(fact)
+                for word in fact.lower().split()[:TRIGGER_WORDS]:
+                    word = word.strip(TRIM)
+                    if word:
+                        self.triggers.setdefault(word, []).append(fact_id)
+        self.cache_size = cache_size or int(os.getenv("FACT_CACHE_SIZE", 2048))
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, text):
+        """Ids of the facts a single message mentions."""
+        hits = set()
+        for token in tokenize(text):
+            hits.update(self.triggers.get(token, ()))
+        return hits
+
+    def mentioned(self, chat_history):
+        """Facts mentioned by assistant messages in chat_history, in order of first mention."""
+        contents = [
+            msg.get("content") or ""
+            for msg in chat_history or ()
+            if msg.get("role") == "assistant"
+        ]
+        keys, key = [], b""
+        for content in contents:
+            key = hashlib.blake2b(key + content.encode("utf-8"), digest_size=16).digest()
+            keys.append(key)
+
+        # Resume from the longest prefix of this conversation seen before.
+        start, state = 0, ()
+        with self._lock:
+            for position in range(len(keys) - 1, -1, -1):
+                cached = self._states.get(keys[position])
+                if cached is not None:
+                    self._states.move_to_end(keys[position])
+                    start, state = position + 1, cached
+                    break
+
+        mentioned = list(state)
+        known = set(state)
+        for position in range(start, len(contents)):
+            for fact_id in sorted(self.match(contents[position]) - known):
+                known.add(fact_id)
+                mentioned.append(fact_id)
+            self._remember(keys[position], tuple(mentioned))
+
+        return [self.facts[fact_id] for fact_id in mentioned]
+
+    def _remember(self, key, state):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.cache_size:
+                self._states.popitem(last=False)
@@ -1,21 +1,65 @@
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from .image_cache import ImageCache, normalize_keywords
+from .singleflight import single_flight, flight_key
+from .metrics import IMAGE_CACHE
 
 load_dotenv()
 
 PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY")
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
+# Overridable so load tests can point lookups at local stand-ins (see bench/).
+PIXABAY_API_BASE = os.getenv("PIXABAY_API_BASE", "https://pixabay.com/api/")
+UNSPLASH_API_BASE = os.getenv("UNSPLASH_API_BASE", "https://api.unsplash.com").rstrip("/")
+
+image_cache = ImageCache()
+
+# Provider requests are I/O-bound; each get_images() call keeps up to two in flight.
+_provider_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_PROVIDER_THREADS", 16)),
+    thread_name_prefix="image-provider",
+)
+
+
+def _cached(provider, fetch, keywords, per_page):
+    """Serve a provider lookup from the image cache, filling it on a miss.
+
+    fetch() returns (urls, complete); empty results are only cached when
+    every request completed, so timeouts and outages are retried next time.
+    """
+    cached = image_cache.get(provider, keywords, per_page)
+    if cached is not None:
+        IMAGE_CACHE.inc(provider=provider, result="hit")
+        return cached
+    IMAGE_CACHE.inc(provider=provider, result="miss")
+
+    # Concurrent lookups of the same keywords share one provider request.
+    key = flight_key(provider, normalize_keywords(keywords), per_page)
+    return list(single_flight.do(key, _fetch_and_store, provider, fetch, keywords, per_page))
+
+
+def _fetch_and_store(provider, fetch, keywords, per_page):
+    urls, complete = fetch(keywords, per_page)
+    if urls or complete:
+        image_cache.set(provider, keywords, per_page, urls)
+    return urls
+
 
 def search_pixabay_photos(keywords: list[str], per_page: int = 5) -> list[str]:
     if not PIXABAY_API_KEY:
         print("Missing Pixabay API key.")
         return []
+    return _cached("pixabay", _fetch_pixabay_photos, keywords, per_page)
+
 
-    base_url = "https://pixabay.com/api/"
+def _fetch_pixabay_photos(keywords, per_page):
+    base_url = PIXABAY_API_BASE
     query_variants = [", ".join(keywords)]
     if keywords:
         query_variants.append(keywords[0])
+    complete = True
 
     for query in query_variants:
         params = {
@@ -32,22 +76,27 @@ def search_pixabay_photos(keywords: list[str], per_page: int = 5) -> list[str]:
             data = response.json()
             hits = data.get("hits", [])
             if hits:
-                return [hit["webformatURL"] for hit in hits]
+                return [hit["webformatURL"] for hit in hits], True
         except Exception as e:
+            complete = False
             print(f"Pixabay error ({query}): {e}")
 
-    return []
+    return [], complete
 
 
 def search_unsplash_photos(keywords: list[str], per_page: int = 5) -> list[str]:
     if not UNSPLASH_ACCESS_KEY:
         print("Missing Unsplash access key.")
         return []
+    return _cached("unsplash", _fetch_unsplash_photos, keywords, per_page)
+
 
-    base_url = "https://api.unsplash.com/search/photos"
+def _fetch_unsplash_photos(keywords, per_page):
+    base_url = f"{UNSPLASH_API_BASE}/search/photos"
     query_variants = [", ".join(keywords)]
     if keywords:
         query_variants.append(keywords[0])
+    complete = True
 
     for query in query_variants:
         params = {
@@ -63,10 +112,25 @@ def search_unsplash_photos(keywords: list[str], per_page: int = 5) -> list[str]:
             data = response.json()
             results = data.get("results", [])
             if results:
-                return [result["urls"]["regular"] for result in results]
+                return [result["urls"]["regular"] for result in results], True
         except Exception as e:
+            complete = False
             print(f"Unsplash error ({query}): {e}")
 
+    return [], complete
+
+
+def _first_non_empty(calls):
+    """Run provider calls in parallel and return the first non-empty result."""
+    futures = [_provider_pool.submit(func, *args) for func, args in calls]
+    for future in as_completed(futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Image provider error: {e}")
+            continue
+        if result:
+            return result
     return []
 
 
@@ -74,15 +138,21 @@ def get_images(keywords: list[str], per_page: int = 5) -> list[str]:
     if not keywords:
         return []
 
-    steps = [
-      lambda: search_pixabay_photos(keywords, per_page),
-      lambda: search_unsplash_photos(keywords, per_page),
-      lambda: search_pixabay_photos([keywords[0]], per_page),
-      lambda: search_unsplash_photos([keywords[0]], per_page),
-  ]
-
-    for step in steps:
-        result = step()
+    # Pixabay and Unsplash are queried side by side; whichever answers first
+    # with photos wins. Only if both come back empty do we retry both with
+    # the first keyword alone.
+    stages = [[
+        (search_pixabay_photos, (keywords, per_page)),
+        (search_unsplash_photos, (keywords, per_page)),
+    ]]
+    if len(keywords) > 1:
+        stages.append([
+            (search_pixabay_photos, ([keywords[0]], per_page)),
+            (search_unsplash_photos, ([keywords[0]], per_page)),
+        ])
+
+    for calls in stages:
+        result = _first_non_empty(calls)
         if result:
             return result
 
@@ -0,0 +1,183 @@
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Context windows of the models offered in the frontend; unknown models get DEFAULT_CONTEXT.
+MODEL_CONTEXT = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "gemma2-9b-it": 8192,
+    "llama-guard-3-8b": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 131072,
+}
+DEFAULT_CONTEXT = 8192
+
+# Even on 128k models a long verbatim history mostly buys latency.
+DEFAULT_MAX_TOKENS = 3000
+# Share of the history budget the summary of older turns may take.
+DEFAULT_SUMMARY_SHARE = 0.25
+DEFAULT_SUMMARY_CACHE_SIZE = 2048
+SUMMARY_LINE_CHARS = 200
+
+# Llama 3 averages ~4 UTF-8 bytes per token on English and fewer on Cyrillic;
+# 3.5 errs on the side of overestimating.
+BYTES_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD = 4
+SAFETY_MARGIN = 256
+
+TAG_RE = re.compile(r"<[^>]+>")
+SENTENCE_RE = re.compile(r"(.+?[.!?])(\s|$)")
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+_totals = {"requests": 0, "compacted": 0, "tokens_saved": 0}
+
+
+def _setting(name, default, cast):
+    # Read on use rather than at import, so values from .env (loaded by main) apply.
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def estimate_tokens(text):
+    """Rough token count for text without running a tokenizer."""
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
+
+
+def messages_tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+
+def history_budget(model, reserved_tokens=0):
+    """Tokens left for chat history once the prompt and the completion are accounted for."""
+    context = MODEL_CONTEXT.get(model, DEFAULT_CONTEXT)
+    max_tokens = _setting("HISTORY_MAX_TOKENS", DEFAULT_MAX_TOKENS, int)
+    return max(0, min(max_tokens, context - reserved_tokens - SAFETY_MARGIN))
+
+
+def _summary_line(message):
+    text = " ".join(TAG_RE.sub(" ", message.get("content") or "").split())
+    match = SENTENCE_RE.match(text)
+    if match:
+        text = match.group(1)
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "…"
+    return f"- {message.get('role', 'user')}: {text}"
+
+
+def _summary_lines(messages):
+    """Summary lines for messages, reusing the lines of the longest already summarized prefix."""
+    keys, key = [], b""
+    for message in messages:
+        payload = f"{message.get('role')}\0{message.get('content') or ''}".encode("utf-8")
+        key = hashlib.blake2b(key + payload, digest_size=16).digest()
+        keys.append(key)
+
+    start, lines = 0, ()
+    with _summaries_lock:
+        for position in range(len(keys) - 1, -1, -1):
+            cached = _summaries.get(keys[position])
+            if cached is not None:
+                _summaries.move_to_end(keys[position])
+                start, lines = position + 1, cached
+                break
+
+    lines = list(lines)
+    for position in range(start, len(messages)):
+        lines.append(_summary_line(messages[position]))
+    if start < len(messages):
+        cache_size = _setting("HISTORY_SUMMARY_CACHE_SIZE", DEFAULT_SUMMARY_CACHE_SIZE, int)
+        with _summaries_lock:
+            _summaries[keys[-1]] = tuple(lines)
+            while len(_summaries) > cache_size:
+                _summaries.popitem(last=False)
+    return lines
+
+
+def compact_history(chat_history, model, reserved_tokens=0):
+    """Fit chat_history into the model's context budget.
+
+    Recent turns are kept verbatim as long as they fit; older ones are folded
+    into a single system message with a one-line extractive summary per turn
+    (the oldest lines are dropped first if even that is too long). Summaries
+    are cached per conversation prefix, so a new turn only summarizes the
+    messages that just fell out of the window.
+
+    Returns (messages, stats) where stats has tokens_before, tokens_after and
+    tokens_saved.
+    """
+    history = [m for m in chat_history or [] if m.get("content")]
+    costs = [message_tokens(m) for m in history]
+    before = sum(costs)
+    budget = history_budget(model, reserved_tokens)
+
+    if before <= budget:
+        return history, _record(before, before, 0)
+
+    summary_budget = int(budget * _setting("HISTORY_SUMMARY_SHARE", DEFAULT_SUMMARY_SHARE, float))
+    kept_tokens, start = 0, len(history)
+    while start > 0 and kept_tokens + costs[start - 1] <= budget - summary_budget:
+        start -= 1
+        kept_tokens += costs[start]
+
+    compacted = history[start:]
+    lines = _summary_lines(history[:start])
+    header = "Summary of the earlier conversation:"
+    summary_tokens = estimate_tokens(header) + MESSAGE_OVERHEAD
+    taken = []
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if summary_tokens + cost > summary_budget:
+            break
+        taken.append(line)
+        summary_tokens += cost
+    if taken:
+        summary = {"role": "system", "content": "\n".join([header] + taken[::-1])}
+        compacted = [summary] + compacted
+    else:
+        summary_tokens = 0
+
+    after = kept_tokens + summary_tokens
+    return compacted, _record(before, after, start)
+
+
+def _record(before, after, folded):
+    stats = {
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": before - after,
+        "summarized_messages": folded,
+    }
+    with _summaries_lock:
+        _totals["requests"] += 1
+        if folded:
+            _totals["compacted"] += 1
+            _totals["tokens_saved"] += before - after
+    if folded:
+        logger.info(
+            f"Compacted chat history: {before} -> {after} tokens "
+            f"({folded} older messages summarized)"
+        )
+    return stats
+
+
+def get_stats():
+    """Process-wide totals: requests seen, requests compacted and tokens saved."""
+    with _summaries_lock:
+        return dict(_totals)
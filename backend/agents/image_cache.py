@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "data" / "image_cache.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    provider TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    per_page INTEGER NOT NULL,
+    urls TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (provider, keywords, per_page)
+);
+CREATE INDEX IF NOT EXISTS images_last_access ON images (last_access);
+"""
+
+
+def normalize_keywords(keywords):
+    """Lowercase and trim keywords, keeping order: providers weight the first one."""
+    return json.dumps([kw.strip().lower() for kw in keywords if kw.strip()], ensure_ascii=False)
+
+
+class ImageCache:
+    """On-disk keyword -> image URL cache shared by all gunicorn workers.
+
+    Entries are keyed by provider and normalized keyword tuple and expire
+    after `ttl` seconds; empty results are cached for the shorter
+    `negative_ttl`. The table is trimmed to `max_entries` by least recent
+    access. SQLite runs in WAL mode with a busy timeout, and every thread of
+    every process opens its own connection, so concurrent workers can read
+    and write safely. Cache failures never break a lookup; they count as a miss.
+    """
+
+    def __init__(self, path=None, ttl=None, negative_ttl=None, max_entries=None):
+        self.path = str(path or os.getenv("IMAGE_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.ttl = float(ttl if ttl is not None else os.getenv("IMAGE_CACHE_TTL", 7 * 24 * 3600))
+        self.negative_ttl = float(
+            negative_ttl if negative_ttl is not None else os.getenv("IMAGE_CACHE_NEGATIVE_TTL", 3600)
+        )
+        self.max_entries = int(max_entries or os.getenv("IMAGE_CACHE_MAX_ENTRIES", 20000))
+        self.enabled = self.ttl > 0
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork: gunicorn workers reopen their own.
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, provider, keywords, per_page):
+        """Return cached URLs (possibly an empty list) or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT keywords, per_page, urls, last_access FROM images "
+                "WHERE provider = ? AND keywords = ? AND per_page >= ? AND expires_at > ? "
+                "ORDER BY per_page LIMIT 1",
+                (provider, normalize_keywords(keywords), per_page, now),
+            ).fetchone()
+            if row is None:
+                return None
+            key, cached_per_page, urls, last_access = row
+            # Refreshing recency on every hit would turn reads into writes.
+            if now - last_access > 60:
+                conn.execute(
+                    "UPDATE images SET last_access = ? WHERE provider = ? AND keywords = ? AND per_page = ?",
+                    (now, provider, key, cached_per_page),
+                )
+            return json.loads(urls)[:per_page]
+        except sqlite3.Error as e:
+            logger.warning(f"Image cache read failed: {e}")
+            return None
+
+    def set(self, provider, keywords, per_page, urls):
+        if not self.enabled:
+            return
+        now = time.time()
+        ttl = self.ttl if urls else self.negative_ttl
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO images (provider, keywords, per_page, urls, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (provider, normalize_keywords(keywords), per_page, json.dumps(urls), now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Image cache write failed: {e}")
+
+    def evict(self):
+        """Drop expired rows, then the least recently used ones above max_entries."""
+        conn = self._connect()
+        conn.execute("DELETE FROM images WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM images WHERE rowid IN ("
+            "SELECT rowid FROM images ORDER BY last_access "
+            "LIMIT max(0, (SELECT COUNT(*) FROM images) - ?))",
+            (self.max_entries,),
+        )
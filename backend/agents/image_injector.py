@@ -0,0 +1,99 @@
+import re
+from .get_images import get_images
+from .metrics import stage
+
+IMAGE_PLACEHOLDER = re.compile(r'<!--IMAGE_KEYWORDS:([^-]+?)-->\s*<!--IMAGE_HERE-->', re.DOTALL)
+IMAGE_KEYWORDS = re.compile(r'<!--IMAGE_KEYWORDS:([^-]+?)-->')
+COMMENT_START = "<!--"
+# A keywords comment longer than this is not one the model is still writing.
+MAX_COMMENT_CHARS = 300
+PHOTOS_PER_LOOKUP = 5
+
+
+def parse_keywords(keywords_str):
+    return [kw.strip() for kw in keywords_str.split(',') if kw.strip()]
+
+
+def keyword_key(keywords):
+    return tuple(sorted({kw.lower() for kw in keywords}))
+
+
+class StreamingImageInjector:
+    """Resolve image placeholders in HTML that arrives in chunks.
+
+    feed() scans only the text it hasn't seen yet, and the moment an
+    <!--IMAGE_KEYWORDS: ...--> comment is complete its lookup starts on
+    `executor`, so photo searches run while the model is still writing.
+    There is one lookup per distinct keyword set; a set used more times than
+    it has photos is looked up again with more. finish() waits for the
+    lookups and replaces every placeholder pair in one pass, assigning URLs
+    in document order so no image is used twice.
+    """
+
+    def __init__(self, executor, lookup=get_images):
+        self.executor = executor
+        self.lookup = lookup
+        self._parts = []
+        self._pending = ""
+        self._lookups = {}
+        self._counts = {}
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        pending = self._pending + chunk
+        end = 0
+        for match in IMAGE_KEYWORDS.finditer(pending):
+            self._request(parse_keywords(match.group(1)))
+            end = match.end()
+        pending = pending[end:]
+
+        # Keep only what may be the start of a comment still being written.
+        start = pending.rfind(COMMENT_START)
+        if start == -1 or "-->" in pending[start:] or len(pending) - start > MAX_COMMENT_CHARS:
+            self._pending = pending[-(len(COMMENT_START) - 1):]
+        else:
+            self._pending = pending[start:]
+
+    def _request(self, keywords):
+        if not keywords:
+            return
+        key = keyword_key(keywords)
+        count = self._counts[key] = self._counts.get(key, 0) + 1
+        lookup = self._lookups.get(key)
+        if lookup is None or count > lookup[1]:
+            per_page = max(PHOTOS_PER_LOOKUP, count + PHOTOS_PER_LOOKUP - 1)
+            future = self.executor.submit(self.lookup, keywords, per_page=per_page)
+            self._lookups[key] = (future, per_page)
+
+    def text(self):
+        """Everything fed so far, placeholders untouched."""
+        return "".join(self._parts)
+
+    def finish(self):
+        html = self.text()
+        img_options = {}
+        with stage("images"):
+            for key, (future, _) in self._lookups.items():
+                try:
+                    img_options[key] = future.result()
+                except Exception as e:
+                    print(f"Image lookup error: {str(e)}")
+                    img_options[key] = []
+
+        used_urls = set()
+
+        def replace(match):
+            keywords_str = match.group(1).strip()
+            keywords = parse_keywords(keywords_str)
+            if not keywords:
+                return match.group(0)
+
+            for url in img_options.get(keyword_key(keywords), []):
+                if url not in used_urls:
+                    used_urls.add(url)
+                    return f'<img src="{url}" width="600" height="400" alt="{keywords_str}">'
+            return "<!--IMAGE_NOT_FOUND-->"
+
+        return IMAGE_PLACEHOLDER.sub(replace, html)
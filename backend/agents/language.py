@@ -0,0 +1,73 @@
+import os
+import re
+import logging
+import threading
+from functools import lru_cache
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+CYRILLIC_RE = re.compile(r"[Ѐ-ӿ]")
+LATIN_RE = re.compile(r"[A-Za-z]")
+UKRAINIAN_RE = re.compile(r"[іїєґІЇЄҐ]")
+RUSSIAN_RE = re.compile(r"[ыэъёЫЭЪЁ]")
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Build the lingua detector once per process, on first ambiguous input."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                from lingua import Language, LanguageDetectorBuilder
+                _detector = LanguageDetectorBuilder.from_languages(
+                    Language.ENGLISH, Language.RUSSIAN, Language.UKRAINIAN
+                ).build()
+                logger.info("Built lingua language detector")
+    return _detector
+
+
+def warm_up():
+    """Build the detector and load its language models now instead of on the first ambiguous input.
+
+    Loading the models takes about half a second and most of the detector's
+    memory, so a gunicorn master does it once before forking its workers.
+    """
+    get_detector().detect_language_of("Привет, нам нужен сайт для компании")
+
+
+def _detect_by_script(text):
+    """Cheap answer from the alphabet alone, or None when it can't tell."""
+    if CYRILLIC_RE.search(text) is None:
+        return "en" if LATIN_RE.search(text) else None
+    if UKRAINIAN_RE.search(text):
+        return "uk"
+    if RUSSIAN_RE.search(text):
+        return "ru"
+    return None
+
+
+def detect_language(text):
+    """Return "en", "ru" or "uk" for text, falling back to "en".
+
+    Latin-only text is English and Cyrillic with letters unique to one
+    alphabet (і/ї/є/ґ or ы/э/ъ/ё) is decided on the spot; lingua only runs on
+    the remaining ambiguous Cyrillic input. Results are memoized per text.
+    """
+    with stage("language"):
+        return _detect_language(text)
+
+
+@lru_cache(maxsize=int(os.getenv("LANGUAGE_CACHE_SIZE", 4096)))
+def _detect_language(text):
+    lang = _detect_by_script(text)
+    if lang:
+        return lang
+    try:
+        lang = get_detector().detect_language_of(text)
+        return lang.iso_code_639_1.name.lower()
+    except:
+        return "en"
@@ -0,0 +1,514 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import httpx
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .response_cache import response_cache
+from .singleflight import single_flight, flight_key
+from .rate_limiter import scheduler, backoff_delay, RateLimitError
+from .model_router import router, note_served
+from .metrics import stage, observe_llm_call
+from .history import messages_tokens
+
+logger = logging.getLogger(__name__)
+# Per-request lines from httpx duplicate the call records logged below.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+DEFAULT_API_BASE = "https://api.groq.com/openai/v1"
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_listeners = []
+
+
+def add_listener(callback):
+    """Register callback(record) invoked after every sync or async call with latency and token usage."""
+    _listeners.append(callback)
+
+
+def _report(record):
+    usage = record.get("usage") or {}
+    logger.info(
+        "LLM call model=%s status=%s latency=%.0fms queued=%.0fms prompt_tokens=%s completion_tokens=%s total_tokens=%s",
+        record["model"], record["status"], record["latency_ms"], record.get("queue_ms") or 0,
+        usage.get("prompt_tokens"), usage.get("completion_tokens"), usage.get("total_tokens"),
+    )
+    for callback in _listeners:
+        try:
+            callback(record)
+        except Exception as e:
+            logger.warning(f"LLM listener failed: {e}")
+
+
+add_listener(router.observe)
+add_listener(observe_llm_call)
+
+
+def _usage_from_chunk(chunk):
+    return chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+
+
+class _BaseLLMClient:
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Worth trying another model: overloaded, rate limited or unknown model.
+    FAILOVER_STATUSES = (404, 408, 429, 500, 502, 503, 504)
+
+    def __init__(self, api_key=None, base_url=None, pool_size=None,
+                 timeout=None, connect_timeout=None, max_retries=None):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.base_url = (base_url or os.getenv("GROQ_API_BASE", DEFAULT_API_BASE)).rstrip("/")
+        self.pool_size = pool_size or _env_int("LLM_POOL_SIZE", 20)
+        self.timeout = timeout or _env_float("LLM_TIMEOUT", 25)
+        self.connect_timeout = connect_timeout or _env_float("LLM_CONNECT_TIMEOUT", 5)
+        self.max_retries = max_retries if max_retries is not None else _env_int("LLM_MAX_RETRIES", 2)
+
+    @property
+    def completions_url(self):
+        return f"{self.base_url}/chat/completions"
+
+    def add_listener(self, callback):
+        add_listener(callback)
+
+    def _cache_key(self, cache, messages, model, params):
+        """Response cache key for a call made with cache=<namespace>, or None when not cached."""
+        if not response_cache.enabled(cache):
+            return None
+        return response_cache.key(cache, model, messages, params)
+
+    def _flight_key(self, kind, messages, model, timeout, params):
+        """Identical concurrent requests share one upstream call (see SingleFlight)."""
+        return flight_key(kind, self.completions_url, model, messages, params, timeout)
+
+    def _candidates(self, model):
+        """Models to try for a call on model, healthiest first (see ModelRouter)."""
+        return router.candidates(model, scheduler.paused_for)
+
+    def _can_fail_over(self, error):
+        if isinstance(error, (RateLimitError, requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+            return True
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        return status in self.FAILOVER_STATUSES
+
+    def _cost(self, payload):
+        """Tokens the call may consume, for the tokens-per-minute bucket."""
+        return messages_tokens(payload["messages"]) + payload.get("max_tokens", 1024)
+
+
+class LLMClient(_BaseLLMClient):
+    """Chat-completions client shared by all agents.
+
+    Keeps one keep-alive connection pool per process so consecutive calls
+    reuse the TLS connection to the provider instead of paying a handshake
+    on every hop. Pool size, timeouts and retries come from the constructor
+    or from the LLM_* environment variables. Every request is admitted by
+    the rate-limit scheduler; priority ("interactive", "normal", "bulk")
+    decides who goes first when the model is at its limit. The model router
+    picks which of the requested model and its fallbacks serves each call.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = self._build_session()
+
+    def _build_session(self):
+        # Only connection failures are retried here; 429/5xx go through the scheduler in _send().
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=0.5,
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Authorization": f"Bearer {self.api_key}"})
+        return session
+
+    def warm(self, connections=None):
+        """Open keep-alive connections to the provider before the first call needs them.
+
+        Each concurrent HEAD request leaves one connection (TCP and TLS done)
+        in the pool; the status doesn't matter. LLM_WARM_CONNECTIONS sets how many.
+        """
+        connections = connections or _env_int("LLM_WARM_CONNECTIONS", 2)
+        timeout = (self.connect_timeout, 5)
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            list(pool.map(lambda _: self.session.head(self.base_url, timeout=timeout), range(connections)))
+
+    def _send(self, payload, timeout, priority, stream=False, record=None):
+        """POST payload once the scheduler admits it, retrying 429 and 5xx responses.
+
+        A 429 pauses the model in the scheduler, so the retry simply queues
+        again; 5xx responses back off with jitter. Returns the last response.
+        Time spent waiting for the scheduler is added to record["queue_ms"], so
+        the router can tell our own throttling from a slow provider.
+        """
+        model = payload["model"]
+        cost = self._cost(payload)
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            scheduler.acquire(model, cost, priority)
+            if record is not None:
+                record["queue_ms"] = record.get("queue_ms", 0) + (time.perf_counter() - queued) * 1000
+            response = self.session.post(
+                self.completions_url,
+                json=payload,
+                timeout=(self.connect_timeout, timeout or self.timeout),
+                stream=stream,
+            )
+            retry_after = scheduler.observe(model, response.status_code, response.headers)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            response.close()
+            if retry_after is None:
+                time.sleep(backoff_delay(attempt))
+
+    def chat(self, messages, model, timeout=None, priority="normal", **params):
+        """POST a chat completion and return the decoded JSON body.
+
+        The call goes to the healthiest of model and its fallbacks and fails
+        over to the next one on timeouts, 429/5xx and unknown-model errors;
+        data["model"] names the model that answered. Raises
+        requests.exceptions.RequestException on transport or HTTP errors, and
+        RateLimitError if the scheduler can't admit the call in time.
+        """
+        candidates = self._candidates(model)
+        for i, candidate in enumerate(candidates):
+            key = self._flight_key("chat", messages, candidate, timeout, params)
+            try:
+                with stage("llm"):
+                    data = single_flight.do(key, self._chat, messages, candidate, timeout, priority, **params)
+            except Exception as e:
+                if i + 1 == len(candidates) or not self._can_fail_over(e):
+                    raise
+                router.note_failover(candidate, candidates[i + 1], e)
+                continue
+            note_served(data.get("model") or candidate)
+            return data
+
+    def _chat(self, messages, model, timeout=None, priority="normal", **params):
+        payload = {"model": model, "messages": messages, **params}
+        started = time.perf_counter()
+        record = {"model": model, "status": None, "usage": None}
+        try:
+            response = self._send(payload, timeout, priority, record=record)
+            record["status"] = response.status_code
+            response.raise_for_status()
+            data = response.json()
+            record["usage"] = data.get("usage")
+            return data
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["latency_ms"] = (time.perf_counter() - started) * 1000
+            _report(record)
+
+    def stream(self, messages, model, timeout=None, cache=None, priority="normal", **params):
+        """Yield content deltas from an upstream `stream: true` completion.
+
+        Usage is taken from the final chunk when the provider sends it;
+        the reported record also carries time to first token. With
+        cache=<namespace> a cached completion is replayed as a single delta,
+        and a fully received one is stored.
+        """
+        key = self._cache_key(cache, messages, model, params)
+        if key:
+            cached = response_cache.get(cache, key)
+            if cached is not None:
+                note_served(model)
+                yield cached
+                return
+        candidates = self._candidates(model)
+        for i, candidate in enumerate(candidates):
+            parts = []
+            flight = self._flight_key("stream", messages, candidate, timeout, params)
+            factory = lambda candidate=candidate: self._stream(messages, candidate, timeout, priority, **params)
+            try:
+                with stage("llm"):
+                    for content in single_flight.do_stream(flight, factory):
+                        parts.append(content)
+                        yield content
+            except Exception as e:
+                # Once tokens went out the answer can't switch models.
+                if parts or i + 1 == len(candidates) or not self._can_fail_over(e):
+                    raise
+                router.note_failover(candidate, candidates[i + 1], e)
+                continue
+            note_served(candidate)
+            # Only the requested model's answers are cached under its key.
+            if key and candidate == model:
+                response_cache.set(cache, key, "".join(parts))
+            return
+
+    def _stream(self, messages, model, timeout=None, priority="normal", **params):
+        payload = {"model": model, "messages": messages, **params, "stream": True}
+        started = time.perf_counter()
+        record = {"model": model, "status": None, "usage": None, "stream": True}
+        try:
+            with self._send(payload, timeout, priority, stream=True, record=record) as response:
+                record["status"] = response.status_code
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None):
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = _usage_from_chunk(chunk)
+                    if usage:
+                        record["usage"] = usage
+                    for choice in chunk.get("choices", []):
+                        content = (choice.get("delta") or {}).get("content")
+                        if content:
+                            if "ttft_ms" not in record:
+                                record["ttft_ms"] = (time.perf_counter() - started) * 1000
+                            yield content
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["latency_ms"] = (time.perf_counter() - started) * 1000
+            _report(record)
+
+    def complete(self, messages, model, timeout=None, cache=None, priority="normal", **params):
+        """Same as chat() but returns only the assistant message content.
+
+        cache names a response cache namespace (usually the agent); repeated
+        prompts within its TTL are answered without calling the model.
+        """
+        key = self._cache_key(cache, messages, model, params)
+        if key:
+            cached = response_cache.get(cache, key)
+            if cached is not None:
+                note_served(model)
+                return cached
+        data = self.chat(messages, model, timeout=timeout, priority=priority, **params)
+        content = data["choices"][0]["message"]["content"]
+        if key and data.get("model", model) == model:
+            response_cache.set(cache, key, content)
+        return content
+
+
+class AsyncLLMClient(_BaseLLMClient):
+    """asyncio counterpart of LLMClient used by the ASGI entry point.
+
+    One httpx.AsyncClient pool serves every in-flight call of the process, so
+    hundreds of concurrent completions cost sockets, not threads. Connection
+    errors are retried by the transport; 429/5xx responses are retried
+    through the same rate-limit scheduler as LLMClient.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("pool_size", _env_int("LLM_ASYNC_POOL_SIZE", 200))
+        super().__init__(**kwargs)
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=self.max_retries),
+        )
+
+    def _timeout(self, timeout):
+        return httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+
+    async def _post(self, payload, timeout, priority="normal", stream=False, record=None):
+        """Async counterpart of LLMClient._send()."""
+        model = payload["model"]
+        cost = self._cost(payload)
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            await scheduler.aacquire(model, cost, priority)
+            if record is not None:
+                record["queue_ms"] = record.get("queue_ms", 0) + (time.perf_counter() - queued) * 1000
+            request = self.client.build_request(
+                "POST", self.completions_url, json=payload, timeout=self._timeout(timeout)
+            )
+            response = await self.client.send(request, stream=stream)
+            retry_after = scheduler.observe(model, response.status_code, response.headers)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            await response.aclose()
+            if retry_after is None:
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def chat(self, messages, model, timeout=None, priority="normal", **params):
+        """POST a chat completion and return the decoded JSON body.
+
+        Fails over between models like LLMClient.chat. Raises httpx.HTTPError
+        on transport or HTTP errors, and RateLimitError if the scheduler can't
+        admit the call in time.
+        """
+        candidates = self._candidates(model)
+        for i, candidate in enumerate(candidates):
+            key = self._flight_key("chat", messages, candidate, timeout, params)
+            try:
+                with stage("llm"):
+                    data = await single_flight.ado(key, self._chat, messages, candidate, timeout, priority, **params)
+            except Exception as e:
+                if i + 1 == len(candidates) or not self._can_fail_over(e):
+                    raise
+                router.note_failover(candidate, candidates[i + 1], e)
+                continue
+            note_served(data.get("model") or candidate)
+            return data
+
+    async def _chat(self, messages, model, timeout=None, priority="normal", **params):
+        payload = {"model": model, "messages": messages, **params}
+        started = time.perf_counter()
+        record = {"model": model, "status": None, "usage": None}
+        try:
+            response = await self._post(payload, timeout, priority, record=record)
+            record["status"] = response.status_code
+            response.raise_for_status()
+            data = response.json()
+            record["usage"] = data.get("usage")
+            return data
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["latency_ms"] = (time.perf_counter() - started) * 1000
+            _report(record)
+
+    async def stream(self, messages, model, timeout=None, cache=None, priority="normal", **params):
+        """Async generator of content deltas from a `stream: true` completion; cache as in LLMClient.stream."""
+        key = self._cache_key(cache, messages, model, params)
+        if key:
+            cached = response_cache.get(cache, key)
+            if cached is not None:
+                note_served(model)
+                yield cached
+                return
+        candidates = self._candidates(model)
+        for i, candidate in enumerate(candidates):
+            parts = []
+            flight = self._flight_key("stream", messages, candidate, timeout, params)
+            factory = lambda candidate=candidate: self._stream(messages, candidate, timeout, priority, **params)
+            try:
+                with stage("llm"):
+                    async for content in single_flight.ado_stream(flight, factory):
+                        parts.append(content)
+                        yield content
+            except Exception as e:
+                if parts or i + 1 == len(candidates) or not self._can_fail_over(e):
+                    raise
+                router.note_failover(candidate, candidates[i + 1], e)
+                continue
+            note_served(candidate)
+            if key and candidate == model:
+                response_cache.set(cache, key, "".join(parts))
+            return
+
+    async def _stream(self, messages, model, timeout=None, priority="normal", **params):
+        payload = {"model": model, "messages": messages, **params, "stream": True}
+        started = time.perf_counter()
+        record = {"model": model, "status": None, "usage": None, "stream": True}
+        response = None
+        try:
+            response = await self._post(payload, timeout, priority, stream=True, record=record)
+            record["status"] = response.status_code
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = _usage_from_chunk(chunk)
+                if usage:
+                    record["usage"] = usage
+                for choice in chunk.get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if "ttft_ms" not in record:
+                            record["ttft_ms"] = (time.perf_counter() - started) * 1000
+                        yield content
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            if response is not None:
+                await response.aclose()
+            record["latency_ms"] = (time.perf_counter() - started) * 1000
+            _report(record)
+
+    async def complete(self, messages, model, timeout=None, cache=None, priority="normal", **params):
+        """Same as chat() but returns only the assistant message content; cache as in LLMClient.complete."""
+        key = self._cache_key(cache, messages, model, params)
+        if key:
+            cached = response_cache.get(cache, key)
+            if cached is not None:
+                note_served(model)
+                return cached
+        data = await self.chat(messages, model, timeout=timeout, priority=priority, **params)
+        content = data["choices"][0]["message"]["content"]
+        if key and data.get("model", model) == model:
+            response_cache.set(cache, key, content)
+        return content
+
+    async def awarm(self, connections=None):
+        """Async counterpart of LLMClient.warm()."""
+        connections = connections or _env_int("LLM_WARM_CONNECTIONS", 2)
+        await asyncio.gather(*(
+            self.client.head(self.base_url, timeout=self._timeout(5)) for _ in range(connections)
+        ))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide LLMClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def get_async_llm_client():
+    """Return the process-wide AsyncLLMClient, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncLLMClient()
+    return _async_client
@@ -0,0 +1,226 @@
+import time
+import threading
+import contextlib
+import contextvars
+
+# Seconds; covers cached lookups (sub-millisecond) through long article generations.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90)
+MAX_TIMING_ENTRIES = 20
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Process-local metrics in the Prometheus text exposition format.
+
+    Counters and histograms are updated as events happen. Collectors are
+    callables run at scrape time that return (name, type, help, samples)
+    tuples, samples being [(labels_dict, value)], for state that other
+    modules already count (caches, rate limiter, router).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "agent_stage_seconds", "Time spent in each agent stage.", ("agent", "stage"))
+STAGE_ERRORS = registry.counter(
+    "agent_stage_errors_total", "Agent stages that raised.", ("agent", "stage"))
+HTTP_SECONDS = registry.histogram(
+    "http_request_seconds", "Time to response headers per endpoint.", ("endpoint", "method", "status"))
+LLM_SECONDS = registry.histogram(
+    "llm_request_seconds", "Upstream chat-completion latency.", ("model", "stream"))
+LLM_TTFT_SECONDS = registry.histogram(
+    "llm_time_to_first_token_seconds", "Time to first streamed token.", ("model",))
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "Upstream chat-completion calls by HTTP status.", ("model", "status"))
+LLM_ERRORS = registry.counter(
+    "llm_errors_total", "Upstream chat-completion calls that failed.", ("model", "error"))
+LLM_TIMEOUTS = registry.counter(
+    "llm_timeouts_total", "Upstream chat-completion calls that timed out.", ("model",))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens reported by the provider.", ("model", "kind"))
+IMAGE_CACHE = registry.counter(
+    "image_cache_requests_total", "Image lookups served from the cache or the provider.", ("provider", "result"))
+SEARCH_CACHE = registry.counter(
+    "web_search_cache_requests_total", "Web searches served from the cache or upstream.", ("result",))
+
+
+def observe_llm_call(record):
+    """LLM client listener: latency, status, errors and token usage of one upstream call."""
+    model = record["model"]
+    stream = "true" if record.get("stream") else "false"
+    LLM_SECONDS.observe(record["latency_ms"] / 1000, model=model, stream=stream)
+    if record.get("ttft_ms") is not None:
+        LLM_TTFT_SECONDS.observe(record["ttft_ms"] / 1000, model=model)
+    LLM_REQUESTS.inc(model=model, status=record.get("status") or "none")
+    error = record.get("error")
+    if error:
+        LLM_ERRORS.inc(model=model, error=error)
+        if "Timeout" in error:
+            LLM_TIMEOUTS.inc(model=model)
+    usage = record.get("usage") or {}
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens"):
+            LLM_TOKENS.inc(usage[f"{kind}_tokens"], model=model, kind=kind)
+
+
+class RequestTiming:
+    """Stage durations collected while one request is served, for its Server-Timing header."""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.started = time.perf_counter()
+        self.entries = []
+
+    def add(self, stage, seconds):
+        # list.append is atomic, so stages finishing on worker threads may add concurrently.
+        self.entries.append((stage, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """Per-stage totals in first-seen order, then the total; parallel calls can add up past it."""
+        totals = {}
+        for stage, seconds in list(self.entries):
+            duration, calls = totals.get(stage, (0.0, 0))
+            totals[stage] = (duration + seconds, calls + 1)
+        parts = []
+        for stage, (seconds, calls) in list(totals.items())[:MAX_TIMING_ENTRIES]:
+            part = f"{stage};dur={seconds * 1000:.2f}"
+            if calls > 1:
+                part += f';desc="{calls} calls"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_timing = contextvars.ContextVar("request_timing", default=None)
+
+
+def start_request(agent):
+    """Begin collecting stage timings for the request being served in this context."""
+    timing = RequestTiming(agent)
+    _timing.set(timing)
+    return timing
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the block as agent stage `name`, in the histogram and the current request's timing."""
+    timing = _timing.get()
+    agent = timing.agent if timing else "none"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(agent=agent, stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, agent=agent, stage=name)
+        if timing:
+            timing.add(name, elapsed)
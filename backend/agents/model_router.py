@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+import threading
+import contextlib
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+_served = contextvars.ContextVar("served_models", default=None)
+
+
+@contextlib.contextmanager
+def served_models():
+    """Collect the models that actually answered the LLM calls made inside the block.
+
+    Calls append to the yielded list in call order, so the last entry is the
+    model behind the final answer.
+    """
+    models = []
+    token = _served.set(models)
+    try:
+        yield models
+    finally:
+        _served.reset(token)
+
+
+def note_served(model):
+    models = _served.get()
+    if models is not None:
+        models.append(model)
+
+
+class _Health:
+    def __init__(self):
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.probe_at = 0.0
+
+
+class ModelRouter:
+    """Order the models a call may be served by, healthiest first.
+
+    Every finished call updates an EWMA of the model's latency and error
+    rate. Latency is the time the provider added on top of generation (queue,
+    prompt processing, network), so a long article does not count as a slow
+    model: total latency minus the reported completion_time, or time to
+    first token for streams. Timeouts and transport, 404, 429 and 5xx
+    failures count as errors; other 4xx responses are the request's fault
+    and don't.
+
+    A model whose EWMA latency exceeds LLM_ROUTER_MAX_LATENCY_MS, whose error
+    rate exceeds LLM_ROUTER_MAX_ERROR_RATE, or which the rate-limit scheduler
+    has paused, is degraded: calls go to its fallbacks first
+    (LLM_FALLBACKS="model=alt1|alt2,...", "*" for any model) and it is only
+    tried last. After LLM_ROUTER_COOLDOWN seconds one call probes it again,
+    and good results bring it back.
+    """
+
+    def __init__(self, fallbacks=None, alpha=None, max_latency_ms=None, max_error_rate=None,
+                 cooldown=None, pause_threshold=1.0):
+        self.fallbacks = fallbacks if fallbacks is not None else self._parse_fallbacks(os.getenv("LLM_FALLBACKS", ""))
+        self.alpha = float(alpha or os.getenv("LLM_ROUTER_ALPHA", 0.3))
+        self.max_latency_ms = float(max_latency_ms or os.getenv("LLM_ROUTER_MAX_LATENCY_MS", 8000))
+        self.max_error_rate = float(max_error_rate or os.getenv("LLM_ROUTER_MAX_ERROR_RATE", 0.5))
+        self.cooldown = float(cooldown if cooldown is not None else os.getenv("LLM_ROUTER_COOLDOWN", 30))
+        self.pause_threshold = pause_threshold
+        self._health = {}
+        self._lock = threading.Lock()
+        self._stats = {"failovers": 0}
+
+    @staticmethod
+    def _parse_fallbacks(spec):
+        fallbacks = {}
+        for item in spec.split(","):
+            if "=" not in item:
+                continue
+            model, alternates = item.split("=", 1)
+            fallbacks[model.strip()] = [m.strip() for m in alternates.split("|") if m.strip()]
+        return fallbacks
+
+    def _chain(self, model):
+        chain = [model]
+        for alternate in self.fallbacks.get(model, self.fallbacks.get("*", [])):
+            if alternate not in chain:
+                chain.append(alternate)
+        return chain
+
+    def _degraded(self, health):
+        if health is None or health.samples == 0:
+            return False
+        return (health.error_rate > self.max_error_rate
+                or (health.latency_ms or 0) > self.max_latency_ms)
+
+    def candidates(self, model, paused_for=None):
+        """Models to try for a call requested on `model`, in order.
+
+        paused_for(model) returns how long the rate-limit scheduler will hold
+        calls to a model; one paused for longer than a second counts as degraded.
+        """
+        chain = self._chain(model)
+        if len(chain) == 1:
+            return chain
+        now = time.monotonic()
+        healthy, degraded = [], []
+        with self._lock:
+            for candidate in chain:
+                health = self._health.get(candidate)
+                paused = paused_for is not None and paused_for(candidate) > self.pause_threshold
+                if not paused and not self._degraded(health):
+                    healthy.append(candidate)
+                elif not paused and now - health.probe_at >= self.cooldown:
+                    # Let one call through to see whether the model has recovered.
+                    health.probe_at = now
+                    healthy.append(candidate)
+                else:
+                    degraded.append(candidate)
+        return healthy + degraded
+
+    def observe(self, record):
+        """LLM client listener: fold one call record into the model's EWMAs."""
+        status = record.get("status")
+        if status is not None and 400 <= status < 500 and status not in (404, 408, 429):
+            return
+        failed = bool(record.get("error"))
+        # Waiting on our own rate-limit buckets says nothing about the provider.
+        queued = record.get("queue_ms") or 0
+        latency = record["latency_ms"] - queued
+        usage = record.get("usage") or {}
+        if not failed:
+            if usage.get("completion_time") is not None:
+                latency = latency - usage["completion_time"] * 1000
+            elif record.get("ttft_ms") is not None:
+                latency = record["ttft_ms"] - queued
+        latency = max(0.0, latency)
+
+        with self._lock:
+            health = self._health.setdefault(record["model"], _Health())
+            was_degraded = self._degraded(health)
+            health.samples += 1
+            health.error_rate += self.alpha * (float(failed) - health.error_rate)
+            if health.latency_ms is None:
+                health.latency_ms = latency
+            else:
+                health.latency_ms += self.alpha * (latency - health.latency_ms)
+            degraded = self._degraded(health)
+            if degraded and not was_degraded:
+                health.probe_at = time.monotonic()
+        if degraded != was_degraded:
+            logger.warning(
+                f"Model {record['model']} {'degraded' if degraded else 'recovered'}: "
+                f"latency {health.latency_ms:.0f}ms, error rate {health.error_rate:.2f}"
+            )
+
+    def note_failover(self, model, alternate, error):
+        with self._lock:
+            self._stats["failovers"] += 1
+        logger.warning(f"{model} failed ({type(error).__name__}), failing over to {alternate}")
+
+    def stats(self):
+        """Failover count and {model: {"latency_ms", "error_rate", "samples", "degraded"}}."""
+        with self._lock:
+            models = {
+                model: {
+                    "latency_ms": round(health.latency_ms or 0, 1),
+                    "error_rate": round(health.error_rate, 3),
+                    "samples": health.samples,
+                    "degraded": self._degraded(health),
+                }
+                for model, health in self._health.items()
+            }
+            return dict(self._stats, models=models)
+
+
+router = ModelRouter()
@@ -1,117 +1,88 @@
 import os
-import json
+import time
+import httpx
 import requests
-from pathlib import Path
-from lingua import Language, LanguageDetectorBuilder
 import logging
-import numpy as np
-import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+from .llm_client import get_llm_client, get_async_llm_client
+from .language import detect_language
+from .project_catalog import ProjectCatalog
+from .history import compact_history, messages_tokens
+from .metrics import stage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ProjectAgent:
-    def __init__(self, default_model="llama3-8b-8192"):
+    GENERATION_PARAMS = {
+        "timeout": 25,
+        "temperature": 0.6,
+        "max_tokens": 1000,
+        "top_p": 0.9
+    }
+
+    def __init__(self, default_model="llama3-8b-8192", index_params=None):
         self.default_model = default_model
         self.api_key = os.getenv("GROQ_API_KEY")
-        self.language_detector = LanguageDetectorBuilder.from_languages(
-            Language.ENGLISH, Language.RUSSIAN, Language.UKRAINIAN
-        ).build()
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable not set")
-
-        self.projects = self._load_projects()
-        self.vectorizer, self.tfidf_matrix = self._load_or_generate_tfidf()
-
-    def _load_projects(self):
-        data_dir = Path(__file__).parent.parent / "data"
-        file_path = data_dir / "projects.json"
+        self.llm = get_llm_client()
+
+        # Replaced wholesale on reload; each request reads it once, so it only
+        # ever sees one consistent set of projects and index.
+        self.catalog = ProjectCatalog(index_params)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def projects(self):
+        return self.catalog.projects
+
+    def reload_projects(self):
+        """Pick up edits to projects.json and swap in the new catalog. Returns reload stats."""
+        with self._reload_lock:
+            catalog, stats = self.catalog.reload()
+            self.catalog = catalog
+        return stats
+
+    def watch_projects(self, interval):
+        """Reload whenever projects.json changes on disk, polling every interval seconds."""
+        if self._watcher is not None or interval <= 0:
+            return
+        self._watcher = threading.Thread(target=self._watch_projects, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def _projects_stamp(self):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                projects = json.load(f)
-                logger.info(f"Successfully loaded {len(projects)} projects")
-                return projects
-        except FileNotFoundError:
-            logger.error(f"Project file not found: {file_path}")
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON in project file: {file_path}")
-        except Exception as e:
-            logger.error(f"Error loading projects: {str(e)}")
-        return []
-
-    def _tfidf_cache_path(self):
-        return Path(__file__).parent.parent / "data" / "tfidf_cache.pkl"
-
-    def _load_or_generate_tfidf(self):
-        cache_path = self._tfidf_cache_path()
-
-        if cache_path.exists():
+            stat = os.stat(self.catalog.projects_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _watch_projects(self, interval):
+        last_stamp = self._projects_stamp()
+        while True:
+            time.sleep(interval)
+            stamp = self._projects_stamp()
+            if stamp is None or stamp == last_stamp:
+                continue
+            last_stamp = stamp
             try:
-                with open(cache_path, 'rb') as f:
-                    cache_data = pickle.load(f)
-                logger.info("Loaded cached TF-IDF data")
-                return cache_data['vectorizer'], cache_data['matrix']
+                self.reload_projects()
             except Exception as e:
-                logger.warning(f"Failed to load TF-IDF cache: {e}")
-
-        return self._generate_and_cache_tfidf(cache_path)
-
-    def _generate_and_cache_tfidf(self, cache_path):
-        if not self.projects:
-            return None, None
-
-        texts = [
-            f"{p['name']} {' '.join(p['industry'])} "
-            f"{' '.join(p['services'])} {' '.join(p['keywords'])}"
-            for p in self.projects
-        ]
-
-        vectorizer = TfidfVectorizer(
-            max_features=500,
-            stop_words='english',
-            min_df=1
-        )
-
-        tfidf_matrix = vectorizer.fit_transform(texts)
-
-        cache_data = {
-            'vectorizer': vectorizer,
-            'matrix': tfidf_matrix
-        }
-
-        with open(cache_path, 'wb') as f:
-            pickle.dump(cache_data, f)
-
-        logger.info(f"Generated and cached TF-IDF at {cache_path}")
-        return vectorizer, tfidf_matrix
+                # Most likely a half-written file; finishing the write changes the stamp again.
+                logger.warning(f"Failed to reload projects, keeping the current catalog: {e}")
 
     def _detect_language(self, text):
-        try:
-            lang = self.language_detector.detect_language_of(text)
-            return lang.iso_code_639_1.name.lower()
-        except:
-            return "en"
+        return detect_language(text)
 
     def _find_similar_projects(self, query, top_n=3, exclude_ids=None):
-        exclude_ids = set(exclude_ids or [])
-        if not self.projects or self.tfidf_matrix is None:
-            return []
-
-        query_vec = self.vectorizer.transform([query])
-        cos_similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-        sorted_indices = np.argsort(cos_similarities)[::-1]
+        with stage("retrieval"):
+            return self.catalog.find_similar(query, top_n=top_n, exclude_ids=exclude_ids)
 
-        selected = []
-        for idx in sorted_indices:
-            project = self.projects[idx]
-            if project["id"] not in exclude_ids:
-                selected.append(project)
-            if len(selected) == top_n:
-                break
-
-        return selected
+    def match_projects(self, queries, top_n=3):
+        """Batch, retrieval-only variant of _find_similar_projects (no LLM call)."""
+        return self.catalog.match_batch(queries, top_n=top_n)
 
     def _format_project_promo(self, projects, lang="en"):
         if not projects:
@@ -131,8 +102,7 @@ class ProjectAgent:
             )
         return "\n\n".join(result)
 
-    def get_response(self, query, model=None, chat_history=None, shown_project_ids=None):
-        model = model or self.default_model
+    def _build_messages(self, query, chat_history, shown_project_ids, model):
         lang = self._detect_language(query)
         shown_project_ids = shown_project_ids or []
 
@@ -164,28 +134,19 @@ class ProjectAgent:
         messages = [{"role": "system", "content": system_prompt}]
         if chat_history:
             filtered_history = [msg for msg in chat_history if msg["role"] != "system"]
-            messages.extend(filtered_history)
+            reserved = messages_tokens(messages) + messages_tokens([{"content": query}]) + self.GENERATION_PARAMS["max_tokens"]
+            messages.extend(compact_history(filtered_history, model, reserved)[0])
         messages.append({"role": "user", "content": query})
+        return messages, similar_projects
 
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.6,
-            "max_tokens": 1000,
-            "top_p": 0.9
-        }
+    def get_response(self, query, model=None, chat_history=None, shown_project_ids=None):
+        model = model or self.default_model
+        messages, similar_projects = self._build_messages(query, chat_history, shown_project_ids, model)
 
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=25
-            )
-            response.raise_for_status()
+            text = self.llm.complete(messages, model=model, cache="project", priority="interactive", **self.GENERATION_PARAMS)
             return {
-                "text": response.json()["choices"][0]["message"]["content"],
+                "text": text,
                 "project_ids": [p["id"] for p in similar_projects]
             }
         except requests.exceptions.RequestException as e:
@@ -195,6 +156,43 @@ class ProjectAgent:
             logger.error(f"Unexpected error: {str(e)}")
             return {"text": "An unexpected error occurred while processing your request."}
 
+    async def aget_response(self, query, model=None, chat_history=None, shown_project_ids=None):
+        """Non-blocking get_response for the ASGI app."""
+        model = model or self.default_model
+        messages, similar_projects = self._build_messages(query, chat_history, shown_project_ids, model)
+
+        try:
+            text = await get_async_llm_client().complete(messages, model=model, cache="project", priority="interactive", **self.GENERATION_PARAMS)
+            return {
+                "text": text,
+                "project_ids": [p["id"] for p in similar_projects]
+            }
+        except httpx.HTTPError as e:
+            logger.error(f"API request failed: {str(e)}")
+            return {"text": "I'm having trouble accessing our project database at the moment. Please try again later."}
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            return {"text": "An unexpected error occurred while processing your request."}
+
+    def stream_response(self, query, model=None, chat_history=None, shown_project_ids=None):
+        """Yield ("token", text) events, then ("done", meta) with the matched project_ids."""
+        model = model or self.default_model
+        messages, similar_projects = self._build_messages(query, chat_history, shown_project_ids, model)
+
+        try:
+            for chunk in self.llm.stream(messages, model=model, cache="project", priority="interactive", **self.GENERATION_PARAMS):
+                yield "token", chunk
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API request failed: {str(e)}")
+            yield "error", {"error": "I'm having trouble accessing our project database at the moment. Please try again later."}
+            return
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            yield "error", {"error": "An unexpected error occurred while processing your request."}
+            return
+
+        yield "done", {"project_ids": [p["id"] for p in similar_projects]}
+
 
 
 # import os
@@ -0,0 +1,211 @@
+import os
+import re
+import copy
+import json
+import hashlib
+import logging
+from pathlib import Path
+from .sparse_index import SparseIndex, index_key
+from .retrieval import SparseRetriever
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+class ProjectCatalog:
+    """projects.json plus the sparse index and retriever built over it.
+
+    This is the retrieval-only half of ProjectAgent: it needs no API key, so
+    the batch matching endpoint and CLI use it directly. A catalog is an
+    immutable snapshot; reload() returns a new one instead of mutating it.
+    """
+
+    INDEX_PARAMS = {
+        "scoring": "tfidf",
+        "fields": ["name", "industry", "services", "keywords"],
+        "max_features": 500,
+        "stop_words": "english",
+        "min_df": 1
+    }
+    # Long free-text fields that can be added to PROJECT_INDEX_FIELDS.
+    TEXT_FIELDS = ("description", "text", "slogan")
+    # Above this share of changed rows a reload rebuilds the vocabulary and idf.
+    REBUILD_RATIO = float(os.getenv("PROJECT_INDEX_REBUILD_RATIO", 0.2))
+
+    def __init__(self, index_params=None, projects_path=None, index_root=None):
+        self.index_params = index_params or self._index_params_from_env()
+        self.projects_path = Path(projects_path or DATA_DIR / "projects.json")
+        self.index_root = Path(index_root or DATA_DIR / "project_index")
+        self.projects_hash = None
+        self.projects = self._load_projects()
+        self.texts = [self._project_text(p) for p in self.projects]
+        self.index = self._load_or_build_index()
+        self.retriever = SparseRetriever(self.index, [p["id"] for p in self.projects]) if self.index else None
+
+    def _read_projects(self):
+        """Return (projects, sha256 of the file), raising on a missing or malformed file."""
+        with open(self.projects_path, "rb") as f:
+            raw = f.read()
+        projects = json.loads(raw.decode("utf-8"))
+        if not isinstance(projects, list):
+            raise ValueError(f"Expected a list of projects in {self.projects_path}")
+        return projects, hashlib.sha256(raw).hexdigest()
+
+    def _load_projects(self):
+        file_path = self.projects_path
+        try:
+            projects, self.projects_hash = self._read_projects()
+            logger.info(f"Successfully loaded {len(projects)} projects")
+            return projects
+        except FileNotFoundError:
+            logger.error(f"Project file not found: {file_path}")
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in project file: {file_path}")
+        except Exception as e:
+            logger.error(f"Error loading projects: {str(e)}")
+        return []
+
+    def _index_params_from_env(self):
+        """INDEX_PARAMS overridden by PROJECT_INDEX_SCORING / _FIELDS / _MAX_FEATURES."""
+        params = dict(self.INDEX_PARAMS)
+        if os.getenv("PROJECT_INDEX_SCORING"):
+            params["scoring"] = os.getenv("PROJECT_INDEX_SCORING").strip().lower()
+        if os.getenv("PROJECT_INDEX_FIELDS"):
+            params["fields"] = [f.strip() for f in os.getenv("PROJECT_INDEX_FIELDS").split(",") if f.strip()]
+        if os.getenv("PROJECT_INDEX_MAX_FEATURES"):
+            max_features = int(os.getenv("PROJECT_INDEX_MAX_FEATURES"))
+            params["max_features"] = max_features if max_features > 0 else None
+        return params
+
+    def _project_text(self, project):
+        parts = []
+        for field in self.index_params["fields"]:
+            value = project.get(field) or ""
+            if isinstance(value, list):
+                value = " ".join(value)
+            if field in self.TEXT_FIELDS:
+                value = re.sub(r"<[^>]+>", " ", value)
+            parts.append(value)
+        return " ".join(parts)
+
+    def _load_or_build_index(self):
+        """Open the index built for projects.json and index_params, rebuilding it if either changed."""
+        if not self.projects:
+            return None
+
+        key = index_key(self.projects_hash, self.index_params)
+        root = self.index_root
+        try:
+            index = SparseIndex.load(root, key)
+            if index is not None:
+                logger.info(f"Loaded {index.scoring} index {key}")
+                return index
+        except Exception as e:
+            logger.warning(f"Failed to load project index: {e}")
+
+        index = SparseIndex.build(self.texts, self.index_params, key)
+        try:
+            path = index.save(root)
+            logger.info(f"Built {index.scoring} index at {path}")
+        except Exception as e:
+            logger.warning(f"Built {index.scoring} index in memory only, could not save it: {e}")
+        return index
+
+    def reload(self):
+        """Re-read projects.json and return (catalog, stats).
+
+        Returns self when the file is unchanged. Otherwise projects whose
+        indexed text is unchanged keep their index rows, and only added or
+        edited ones are vectorized against the current vocabulary. When more
+        than REBUILD_RATIO of the rows changed (new terms would be missed and
+        idf drifts), or there is no index yet, the index is rebuilt instead.
+        Raises if the file can't be read, leaving the caller on the old snapshot.
+        """
+        projects, projects_hash = self._read_projects()
+        if projects_hash == self.projects_hash:
+            return self, {"changed": False, "projects": len(self.projects)}
+
+        texts = [self._project_text(p) for p in projects]
+        rows_by_text = {}
+        for row, text in enumerate(self.texts):
+            rows_by_text.setdefault(text, []).append(row)
+        sources = [rows_by_text[text].pop(0) if rows_by_text.get(text) else None for text in texts]
+
+        old_ids = {p["id"] for p in self.projects}
+        new_ids = {p["id"] for p in projects}
+        fresh = [p for p, row in zip(projects, sources) if row is None]
+        stats = {
+            "changed": True,
+            "projects": len(projects),
+            "added": sum(1 for p in fresh if p["id"] not in old_ids),
+            "updated": sum(1 for p in fresh if p["id"] in old_ids),
+            "removed": len(old_ids - new_ids),
+            "unchanged": len(projects) - len(fresh),
+        }
+
+        catalog = copy.copy(self)
+        catalog.projects = projects
+        catalog.projects_hash = projects_hash
+        catalog.texts = texts
+        key = index_key(projects_hash, self.index_params)
+        if self.index is None or not projects or len(fresh) > self.REBUILD_RATIO * len(projects):
+            catalog.index = catalog._load_or_build_index()
+            stats["rebuilt"] = True
+        else:
+            catalog.index = self.index.updated(sources, [t for t, row in zip(texts, sources) if row is None], key)
+            stats["rebuilt"] = False
+        catalog.retriever = SparseRetriever(catalog.index, [p["id"] for p in projects]) if catalog.index else None
+        logger.info(f"Reloaded projects: {stats}")
+        return catalog, stats
+
+    def find_similar(self, query, top_n=3, exclude_ids=None):
+        if not self.projects or self.retriever is None:
+            return []
+
+        return [
+            self.projects[row]
+            for row, _ in self.retriever.search(query, k=top_n, exclude_ids=exclude_ids)
+        ]
+
+    def match_batch(self, queries, top_n=3):
+        """Retrieval-only matching for many queries at once.
+
+        queries is a list of {"message": ..., "exclude_ids": [...]} dicts
+        (an optional "id" is echoed back). Returns one
+        {"id", "project_ids", "scores"} dict per query, in input order. A
+        query with a non-string message, or exclude_ids that isn't a list of
+        string or integer ids, gets empty matches and an "error" instead of
+        failing the whole batch.
+        """
+        results = [{"id": q.get("id"), "project_ids": [], "scores": []} for q in queries]
+        valid = []
+        for query, result in zip(queries, results):
+            error = self._query_error(query)
+            if error:
+                result["error"] = error
+            else:
+                valid.append((query, result))
+        if not valid or self.retriever is None:
+            return results
+
+        matches = self.retriever.search_batch(
+            [query.get("message") or "" for query, _ in valid],
+            k=top_n,
+            exclude_ids=[query.get("exclude_ids") or () for query, _ in valid],
+        )
+        for (_, result), match in zip(valid, matches):
+            result["project_ids"] = [self.projects[row]["id"] for row, _ in match]
+            result["scores"] = [round(score, 6) for _, score in match]
+        return results
+
+    @staticmethod
+    def _query_error(query):
+        if not isinstance(query.get("message") or "", str):
+            return "message must be a string"
+        exclude_ids = query.get("exclude_ids") or []
+        if not isinstance(exclude_ids, list) or not all(
+            isinstance(i, (str, int)) and not isinstance(i, bool) for i in exclude_ids
+        ):
+            return "exclude_ids must be a list of project ids"
+        return None
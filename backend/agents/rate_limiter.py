@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: short chat turns go ahead of long article generations.
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+POLL_INTERVAL = 0.05
+
+
+class RateLimitError(RuntimeError):
+    """Raised when a call can't get a slot within the scheduler's max wait."""
+
+
+def parse_duration(value):
+    """Seconds from a retry-after / x-ratelimit-reset value ("7", "7.66s", "2m59.56s", "120ms")."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    """Exponential backoff with full jitter, so retrying callers don't move in lockstep."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class _Bucket:
+    """Per-minute token bucket; a capacity of 0 means unlimited."""
+
+    def __init__(self, per_minute):
+        self.updated = time.monotonic()
+        self.resize(per_minute)
+
+    def resize(self, per_minute):
+        unlimited = not getattr(self, "capacity", 0)
+        self.capacity = float(per_minute or 0)
+        self.rate = self.capacity / 60.0
+        # A bucket that was unlimited starts full rather than empty.
+        self.level = self.capacity if unlimited else min(self.level, self.capacity)
+
+    def refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost):
+        if not self.capacity:
+            return 0.0
+        # A request bigger than the whole bucket goes through when it is full.
+        cost = min(cost, self.capacity)
+        return 0.0 if self.level >= cost else (cost - self.level) / self.rate
+
+    def take(self, cost):
+        if self.capacity:
+            self.level -= min(cost, self.capacity)
+
+
+class _ModelState:
+    def __init__(self, rpm, tpm):
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.tpm_configured = bool(tpm)
+        self.blocked_until = 0.0
+        self.waiters = []
+        self.cancelled = set()
+
+
+class RateLimitScheduler:
+    """Admission control for chat-completion calls, per model.
+
+    Every call takes one request from a requests-per-minute bucket and its
+    estimated prompt + max_tokens from a tokens-per-minute bucket. Limits
+    come from LLM_RPM / LLM_TPM (0 = unlimited) or LLM_RATE_LIMITS
+    ("model=rpm:tpm,..."); when no TPM is configured it is learned from the
+    provider's x-ratelimit-*-tokens headers, and the remaining-tokens header
+    keeps the bucket in step with the provider's own accounting.
+
+    A 429 pauses the whole model for retry-after (or a jittered backoff)
+    instead of letting each caller retry on its own, so the process backs
+    off together and resumes at the limit rather than in a retry storm.
+    Waiting calls are admitted strictly by priority, then arrival order.
+    A call that waits longer than LLM_QUEUE_TIMEOUT raises RateLimitError.
+    """
+
+    def __init__(self, rpm=None, tpm=None, limits=None, max_wait=None):
+        self.rpm = int(rpm if rpm is not None else os.getenv("LLM_RPM", 0))
+        self.tpm = int(tpm if tpm is not None else os.getenv("LLM_TPM", 0))
+        self.limits = limits if limits is not None else self._parse_limits(os.getenv("LLM_RATE_LIMITS", ""))
+        self.max_wait = float(max_wait if max_wait is not None else os.getenv("LLM_QUEUE_TIMEOUT", 30))
+        self._models = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._sequence = itertools.count()
+        self._stats = {"admitted": 0, "waited": 0, "wait_ms": 0.0, "rate_limited": 0, "timeouts": 0}
+
+    @staticmethod
+    def _parse_limits(spec):
+        limits = {}
+        for item in spec.split(","):
+            if "=" not in item:
+                continue
+            model, values = item.split("=", 1)
+            rpm, _, tpm = values.partition(":")
+            limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+        return limits
+
+    def _state(self, model):
+        state = self._models.get(model)
+        if state is None:
+            rpm, tpm = self.limits.get(model, (self.rpm, self.tpm))
+            state = self._models[model] = _ModelState(rpm, tpm)
+        return state
+
+    def _enqueue(self, model, priority):
+        ticket = (PRIORITIES.get(priority, PRIORITIES["normal"]), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._state(model).waiters, ticket)
+        return ticket
+
+    def _try_acquire(self, model, ticket, cost):
+        """Admit ticket and return 0, or return how long to wait before trying again. Caller holds the lock."""
+        state = self._state(model)
+        while state.waiters and state.waiters[0] in state.cancelled:
+            state.cancelled.discard(heapq.heappop(state.waiters))
+        if not state.waiters or state.waiters[0] != ticket:
+            return POLL_INTERVAL
+
+        now = time.monotonic()
+        state.requests.refill(now)
+        state.tokens.refill(now)
+        wait = max(state.blocked_until - now, state.requests.wait_time(1), state.tokens.wait_time(cost))
+        if wait > 0:
+            return wait
+
+        heapq.heappop(state.waiters)
+        state.requests.take(1)
+        state.tokens.take(cost)
+        self._stats["admitted"] += 1
+        return 0.0
+
+    def _give_up(self, model, ticket, waited):
+        state = self._state(model)
+        state.cancelled.add(ticket)
+        self._stats["timeouts"] += 1
+        self._condition.notify_all()
+        return RateLimitError(f"No capacity for {model} after waiting {waited:.1f}s")
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self._stats["waited"] += 1
+            self._stats["wait_ms"] += waited * 1000
+
+    def acquire(self, model, cost, priority="normal"):
+        """Block until the call may be sent."""
+        ticket = self._enqueue(model, priority)
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                wait = self._try_acquire(model, ticket, cost)
+                if not wait:
+                    self._record_wait(started)
+                    # The next waiter may now be at the head of the queue.
+                    self._condition.notify_all()
+                    return
+                waited = time.monotonic() - started
+                if waited + wait > self.max_wait and waited > 0:
+                    raise self._give_up(model, ticket, waited)
+                self._condition.wait(min(wait, self.max_wait))
+
+    async def aacquire(self, model, cost, priority="normal"):
+        """Coroutine version of acquire(); waits without blocking the event loop."""
+        ticket = self._enqueue(model, priority)
+        started = time.monotonic()
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(model, ticket, cost)
+                    if not wait:
+                        self._record_wait(started)
+                        self._condition.notify_all()
+                        return
+                    waited = time.monotonic() - started
+                    if waited + wait > self.max_wait and waited > 0:
+                        raise self._give_up(model, ticket, waited)
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        except asyncio.CancelledError:
+            with self._condition:
+                self._state(model).cancelled.add(ticket)
+                self._condition.notify_all()
+            raise
+
+    def observe(self, model, status, headers):
+        """Sync the buckets with the provider's rate-limit headers.
+
+        Returns how long a retry should wait if the call was rate limited.
+        """
+        now = time.monotonic()
+        retry_after = None
+        with self._condition:
+            state = self._state(model)
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if limit_tokens and not state.tpm_configured:
+                try:
+                    if float(limit_tokens) != state.tokens.capacity:
+                        state.tokens.resize(float(limit_tokens))
+                except ValueError:
+                    pass
+            if remaining_tokens and state.tokens.capacity:
+                try:
+                    state.tokens.refill(now)
+                    state.tokens.level = min(state.tokens.level, float(remaining_tokens))
+                except ValueError:
+                    pass
+            # x-ratelimit-*-requests is the daily quota; once it is spent nothing gets through until reset.
+            if headers.get("x-ratelimit-remaining-requests") == "0":
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    state.blocked_until = max(state.blocked_until, now + reset)
+
+            if status == 429:
+                self._stats["rate_limited"] += 1
+                retry_after = parse_duration(headers.get("retry-after"))
+                if retry_after is None:
+                    retry_after = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                if retry_after is None:
+                    retry_after = backoff_delay(2)
+                # Jitter spreads the resumed calls over a short window.
+                retry_after += random.uniform(0, 0.25)
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+                logger.warning(f"Rate limited on {model}, pausing it for {retry_after:.1f}s")
+            self._condition.notify_all()
+        return retry_after
+
+    def paused_for(self, model):
+        """Seconds until calls to model are admitted again after a 429 or a spent quota."""
+        with self._lock:
+            state = self._models.get(model)
+            return max(0.0, state.blocked_until - time.monotonic()) if state else 0.0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+scheduler = RateLimitScheduler()
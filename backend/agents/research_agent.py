@@ -1,7 +1,9 @@
 import os
-import requests
-from ddgs import DDGS
-from lingua import Language, LanguageDetectorBuilder
+from .web_search import get_web_search
+from .llm_client import get_llm_client, get_async_llm_client
+from .language import detect_language
+from .concurrency import run_blocking
+from .history import compact_history, messages_tokens
 
 AGENCY_DESCRIPTION = """
 Halo Lab are a creative digital agency specializing in web design, development, SEO, testing, and product redesigns.
@@ -16,21 +18,21 @@ You can also mention potential social, cultural, commercial, or aesthetic value
 """
 
 class ResearchAgent:
+    GENERATION_PARAMS = {
+        "timeout": 15,
+        "temperature": 0.6,
+        "max_tokens": 800
+    }
+
     def __init__(self, default_model="llama3-8b-8192"):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.default_model = default_model
-        self.language_detector = LanguageDetectorBuilder.from_languages(
-            Language.ENGLISH, Language.RUSSIAN, Language.UKRAINIAN
-        ).build()
         if not self.api_key:
             raise ValueError("GROQ_API_KEY required")
+        self.llm = get_llm_client()
         
     def _detect_language(self, text):
-        try:
-            lang = self.language_detector.detect_language_of(text)
-            return lang.iso_code_639_1.name.lower()
-        except:
-            return "en"
+        return detect_language(text)
 
     def _clean_text(self, text):
         if not text:
@@ -38,11 +40,7 @@ class ResearchAgent:
         return " ".join(text.replace('\n', ' ').strip().split())
 
     def _web_search(self, query, max_results=5):
-        try:
-            with DDGS(timeout=10) as ddgs:
-                return list(ddgs.text(query, max_results=max_results))
-        except:
-            return []
+        return get_web_search().search(query, max_results=max_results, timeout=10)
 
     def _format_results(self, results):
         if not results:
@@ -52,10 +50,8 @@ class ResearchAgent:
             for r in results
         )
 
-    def search_web(self, query, model=None, chat_history=None):
-        model = model or self.default_model
-        query_language = self._detect_language(query)        
-        search_results = self._web_search(query)
+    def _build_messages(self, query, chat_history, search_results, model):
+        query_language = self._detect_language(query)
         formatted_results = self._format_results(search_results)
 
         system_prompt = (
@@ -76,25 +72,42 @@ class ResearchAgent:
         ]
 
         if chat_history:
-            messages += chat_history
+            reserved = messages_tokens(messages) + messages_tokens([{"content": query}]) + self.GENERATION_PARAMS["max_tokens"]
+            messages += compact_history(chat_history, model, reserved)[0]
 
         messages.append({"role": "user", "content": query})
+        return messages
 
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.6,
-            "max_tokens": 800
-        }
+    def search_web(self, query, model=None, chat_history=None):
+        model = model or self.default_model
+        messages = self._build_messages(query, chat_history, self._web_search(query), model)
 
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=15
-            )
-            return response.json()["choices"][0]["message"]["content"]
+            return self.llm.complete(messages, model=model, cache="research", priority="normal", **self.GENERATION_PARAMS)
         except Exception as e:
             return f"API error: {str(e)}"
+
+    async def asearch_web(self, query, model=None, chat_history=None):
+        """Non-blocking search_web for the ASGI app; DDGS runs on the shared I/O pool."""
+        model = model or self.default_model
+        search_results = await run_blocking(self._web_search, query)
+        messages = self._build_messages(query, chat_history, search_results, model)
+
+        try:
+            return await get_async_llm_client().complete(messages, model=model, cache="research", priority="normal", **self.GENERATION_PARAMS)
+        except Exception as e:
+            return f"API error: {str(e)}"
+
+    def stream_search_web(self, query, model=None, chat_history=None):
+        """Yield ("token", text) events as the answer is generated, then ("done", meta)."""
+        model = model or self.default_model
+        messages = self._build_messages(query, chat_history, self._web_search(query), model)
+
+        try:
+            for chunk in self.llm.stream(messages, model=model, cache="research", priority="normal", **self.GENERATION_PARAMS):
+                yield "token", chunk
+        except Exception as e:
+            yield "error", {"error": f"API error: {str(e)}"}
+            return
+        yield "done", {}
+
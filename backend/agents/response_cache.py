@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Seconds a completion is reused, per agent. Research and copywriter prompts
+# embed live search results, so they rarely repeat and are off by default.
+DEFAULT_TTLS = {
+    "welcome": 3600,
+    "project": 3600,
+    "research": 0,
+    "copywriter": 0,
+}
+# Generation settings that don't change the text.
+IGNORED_PARAMS = ("timeout", "stream")
+
+
+def normalize_text(text):
+    """Casefold and collapse whitespace so trivially different prompts share an entry."""
+    return " ".join((text or "").casefold().split())
+
+
+class ResponseCache:
+    """In-process LRU of LLM completions keyed on the normalized request.
+
+    The key covers the cache namespace (the agent), the model, every
+    message's role and normalized content and the sampling parameters, so
+    only requests that would be sent to the model as the same prompt share
+    an entry. Each namespace has its own TTL (LLM_CACHE_TTL_<AGENT>, 0
+    disables it); all namespaces share one size bound (LLM_CACHE_MAX_ENTRIES)
+    evicted least recently used first. Hits and misses are counted per
+    namespace. The environment is read on first use rather than at import,
+    so settings from .env apply to the module-level instance.
+    """
+
+    def __init__(self, max_entries=None, ttls=None):
+        self._max_entries = max_entries
+        self._ttls = dict(ttls or {})
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def max_entries(self):
+        if not self._max_entries:
+            self._max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+        return self._max_entries
+
+    def ttl(self, namespace):
+        ttl = self._ttls.get(namespace)
+        if ttl is None:
+            env = os.getenv(f"LLM_CACHE_TTL_{namespace.upper()}")
+            ttl = self._ttls[namespace] = float(env) if env is not None else DEFAULT_TTLS.get(namespace, 0)
+        return ttl
+
+    def enabled(self, namespace):
+        return bool(namespace) and self.ttl(namespace) > 0
+
+    def key(self, namespace, model, messages, params):
+        payload = json.dumps(
+            {
+                "namespace": namespace,
+                "model": model,
+                "messages": [(m.get("role"), normalize_text(m.get("content"))) for m in messages],
+                "params": {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, namespace, outcome):
+        stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        stats[outcome] += 1
+
+    def get(self, namespace, key):
+        """Return the cached completion or None, counting the hit or miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count(namespace, "hits")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._count(namespace, "misses")
+            return None
+
+    def set(self, namespace, key, content):
+        if not content:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl(namespace), content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """{namespace: {"hits", "misses", "ttl"}} plus the current entry count."""
+        with self._lock:
+            stats = {
+                namespace: dict(counts, ttl=self.ttl(namespace))
+                for namespace, counts in self._stats.items()
+            }
+            return {"entries": len(self._entries), "namespaces": stats}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
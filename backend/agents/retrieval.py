@@ -0,0 +1,96 @@
+import numpy as np
+
+# Upper bound on dense score cells per batch block (8 bytes each).
+BATCH_CELLS = 4_000_000
+
+
+class SparseRetriever:
+    """Top-k retrieval over a SparseIndex with id-based exclusion.
+
+    A query only touches the posting lists of its own terms: they are
+    gathered in one vectorized slice and summed per document with bincount,
+    so cost grows with the postings of the query terms, not with a Python
+    loop over the catalog. Excluded ids are masked through an id -> rows map
+    (ids need not be unique) and the best k rows are picked with
+    argpartition instead of a full sort.
+    """
+
+    def __init__(self, index, ids):
+        self.index = index
+        self.ids = list(ids)
+        rows_by_id = {}
+        for row, project_id in enumerate(self.ids):
+            rows_by_id.setdefault(project_id, []).append(row)
+        self.id_rows = {key: np.array(rows, dtype=np.int64) for key, rows in rows_by_id.items()}
+
+    def scores(self, query):
+        """Dense score per document for a single query string."""
+        postings = self.index.matrix
+        cols, weights = self.index.query_weights(query)
+        starts = postings.indptr[cols]
+        lengths = postings.indptr[cols + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(self.index.n_docs)
+        # Positions of every posting of every query term, without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        rows = postings.indices[offsets]
+        contributions = postings.data[offsets] * np.repeat(weights, lengths)
+        return np.bincount(rows, weights=contributions, minlength=self.index.n_docs)
+
+    def exclusion_rows(self, exclude_ids):
+        rows = [self.id_rows[i] for i in exclude_ids or () if i in self.id_rows]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def top_k(self, scores, k, exclude_rows=None):
+        """Indices of the k best rows (best first), never returning excluded rows."""
+        scores = np.asarray(scores, dtype=np.float64)
+        if exclude_rows is not None and len(exclude_rows):
+            scores = scores.copy()
+            scores[exclude_rows] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return candidates[np.isfinite(scores[candidates])]
+
+    def search(self, query, k=3, exclude_ids=None):
+        """Return [(row, score)] for the k best documents not in exclude_ids."""
+        scores = self.scores(query)
+        rows = self.top_k(scores, k, self.exclusion_rows(exclude_ids))
+        return [(int(row), float(scores[row])) for row in rows]
+
+    def search_batch(self, queries, k=3, exclude_ids=None):
+        """Score many queries with one sparse product per block of queries.
+
+        exclude_ids is an optional list (one entry per query) of ids to skip.
+        Returns one [(row, score)] list per query, best first.
+        """
+        exclude_ids = exclude_ids or [()] * len(queries)
+        query_matrix = self.index.transform(queries)
+        postings_t = self.index.matrix.T.tocsr()
+        n_docs = self.index.n_docs
+        block = max(1, BATCH_CELLS // max(n_docs, 1))
+        k = min(k, n_docs)
+        results = []
+        for start in range(0, len(queries), block):
+            stop = min(start + block, len(queries))
+            scores = (query_matrix[start:stop] @ postings_t).toarray()
+            excluded = [self.exclusion_rows(ids) for ids in exclude_ids[start:stop]]
+            lengths = [len(rows) for rows in excluded]
+            if sum(lengths):
+                scores[np.repeat(np.arange(stop - start), lengths), np.concatenate(excluded)] = -np.inf
+            if k <= 0:
+                results.extend([] for _ in range(stop - start))
+                continue
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for rows, row_scores in zip(top.tolist(), top_scores.tolist()):
+                results.append([
+                    (row, score) for row, score in zip(rows, row_scores) if score != -np.inf
+                ])
+        return results
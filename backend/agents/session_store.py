@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import secrets
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_PATH = Path(__file__).parent.parent / "data" / "sessions.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+"""
+
+
+def worker_count():
+    """Worker processes serving the app: GUNICORN_WORKERS (set in gunicorn.conf.py), else WEB_CONCURRENCY."""
+    for name in ("GUNICORN_WORKERS", "WEB_CONCURRENCY"):
+        try:
+            return int(os.environ[name])
+        except (KeyError, ValueError):
+            continue
+    return 1
+
+
+def new_session():
+    return {"history": [], "lang": None, "audience": None, "shown_project_ids": []}
+
+
+class SessionStore:
+    """Server-side conversation state keyed by agent and session id.
+
+    A session holds the chat history plus what the agents worked out on
+    earlier turns (language, audience, projects already shown), so clients
+    only need to send the new message and their session_id.
+
+    Sessions live in a bounded in-memory LRU. With the "memory" backend
+    they are per-process and lost on restart. With "sqlite" every update is
+    also written to a WAL-mode SQLite file shared by all workers on the host;
+    a worker revalidates its cached copy against the row's updated_at, so a
+    conversation can hop between workers. Unless SESSION_BACKEND says
+    otherwise, sqlite is used when several workers serve the app (see
+    worker_count()) and memory for a single process. Sessions idle for
+    longer than `ttl` seconds expire, and history is capped at `max_messages`
+    (older turns are compacted per request anyway).
+    """
+
+    def __init__(self, backend=None, path=None, max_sessions=None, ttl=None, max_messages=None):
+        self._backend = backend
+        self.path = str(path or os.getenv("SESSION_DB_PATH") or DEFAULT_SESSION_PATH)
+        self.max_sessions = int(max_sessions or os.getenv("SESSION_CACHE_SIZE", 10000))
+        self.ttl = float(ttl if ttl is not None else os.getenv("SESSION_TTL", 7 * 24 * 3600))
+        self.max_messages = int(max_messages or os.getenv("SESSION_MAX_MESSAGES", 200))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def backend(self):
+        # Resolved on first use: a preloading gunicorn master builds the store
+        # before gunicorn.conf.py's post_fork has published the worker count.
+        if self._backend is None:
+            default = "sqlite" if worker_count() > 1 else "memory"
+            self._backend = os.getenv("SESSION_BACKEND", default).lower()
+        return self._backend
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(16)
+
+    def _key(self, agent, session_id):
+        return f"{agent}:{session_id}"
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork: gunicorn workers reopen their own.
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key, updated_at, data):
+        # Sessions are cached as JSON so callers always get their own copy.
+        with self._lock:
+            self._sessions[key] = (updated_at, data)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get(self, agent, session_id):
+        """Return a copy of the session, or None if it is unknown or expired."""
+        key = self._key(agent, session_id)
+        now = time.time()
+        with self._lock:
+            cached = self._sessions.get(key)
+            if cached is not None:
+                self._sessions.move_to_end(key)
+
+        if self.backend != "sqlite":
+            if cached is None or now - cached[0] > self.ttl:
+                return None
+            return json.loads(cached[1])
+
+        try:
+            conn = self._connect()
+            if cached is not None:
+                row = conn.execute("SELECT updated_at FROM sessions WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] == cached[0] and now - cached[0] <= self.ttl:
+                    return json.loads(cached[1])
+            row = conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE key = ? AND updated_at > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Session read failed: {e}")
+            if cached is None or now - cached[0] > self.ttl:
+                return None
+            return json.loads(cached[1])
+
+        if row is None:
+            return None
+        self._remember(key, row[1], row[0])
+        return json.loads(row[0])
+
+    def _serialize(self, session):
+        """JSON for session with its history trimmed to max_messages."""
+        session = dict(session, history=list(session.get("history", []))[-self.max_messages:])
+        return json.dumps(session, ensure_ascii=False)
+
+    def _write(self, conn, key, data, updated_at):
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (key, data, updated_at) VALUES (?, ?, ?)",
+            (key, data, updated_at),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (updated_at - self.ttl,))
+
+    def save(self, agent, session_id, session):
+        """Store session, trimming its history to max_messages."""
+        key = self._key(agent, session_id)
+        data = self._serialize(session)
+        updated_at = time.time()
+        self._remember(key, updated_at, data)
+
+        if self.backend != "sqlite":
+            return
+        try:
+            self._write(self._connect(), key, data, updated_at)
+        except sqlite3.Error as e:
+            logger.warning(f"Session write failed: {e}")
+
+    def update(self, agent, session_id, fn):
+        """Store fn(current session) as one atomic read-modify-write and return it.
+
+        fn gets a copy of the stored session (a new one if it is unknown or
+        expired), so two turns of one conversation finishing at once each
+        build on the other's messages instead of overwriting them. With sqlite
+        the read and the write share a BEGIN IMMEDIATE transaction, which
+        also serializes workers; in memory a lock does.
+        """
+        key = self._key(agent, session_id)
+        if self.backend == "sqlite":
+            try:
+                return self._update_sqlite(key, fn)
+            except sqlite3.Error as e:
+                logger.warning(f"Session write failed: {e}")
+        with self._update_lock:
+            session = fn(self._cached(key) or new_session())
+            self._remember(key, time.time(), self._serialize(session))
+        return session
+
+    def _cached(self, key):
+        with self._lock:
+            cached = self._sessions.get(key)
+        if cached is None or time.time() - cached[0] > self.ttl:
+            return None
+        return json.loads(cached[1])
+
+    def _update_sqlite(self, key, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE key = ? AND updated_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+            session = fn(json.loads(row[0]) if row else new_session())
+            data = self._serialize(session)
+            updated_at = time.time()
+            self._write(conn, key, data, updated_at)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._remember(key, updated_at, data)
+        return session
+
+    def delete(self, agent, session_id):
+        key = self._key(agent, session_id)
+        with self._lock:
+            self._sessions.pop(key, None)
+        if self.backend == "sqlite":
+            try:
+                self._connect().execute("DELETE FROM sessions WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                logger.warning(f"Session delete failed: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore()
+    return _store
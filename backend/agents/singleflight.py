@@ -0,0 +1,232 @@
+import json
+import asyncio
+import hashlib
+import threading
+
+
+def flight_key(*parts):
+    """Stable key for call arguments (anything JSON-serializable)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    """Items of one upstream iterator, replayed to every consumer that joins."""
+
+    def __init__(self):
+        self.items = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self.cancelled = False
+        self.producer = None
+
+
+class SingleFlight:
+    """Coalesce concurrent identical upstream calls into one.
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for it and get the same result, or the same exception. Once
+    the call finishes the key is released, so this is not a cache: later
+    calls go upstream again (the response and image caches handle reuse).
+
+    do() and do_stream() serve threads (Flask workers, the I/O pool);
+    ado() and ado_stream() serve coroutines on the running event loop.
+    Streams are read upstream by a producer of their own and buffered, so
+    every consumer, early or late, sees all items, and one consumer going
+    away does not cut the others off. When the last one goes away the
+    producer stops and closes the upstream iterator (and with it the
+    response), so nobody pays for tokens no one will read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._tasks = {}
+        self._async_streams = {}
+        self._producers = set()
+        self._stats = {"calls": 0, "shared": 0}
+
+    def _count(self, shared):
+        with self._lock:
+            self._stats["calls"] += 1
+            if shared:
+                self._stats["shared"] += 1
+
+    def stats(self):
+        """Calls seen and how many of them joined an in-flight call instead of going upstream."""
+        with self._lock:
+            return dict(self._stats)
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def do_stream(self, key, factory):
+        """Iterate factory() once per key, yielding its items to every concurrent caller."""
+        with self._lock:
+            entry = self._streams.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._streams[key] = (_Stream(), threading.Condition())
+            entry[0].subscribers += 1
+        self._count(not leader)
+        stream, condition = entry
+
+        if leader:
+            thread = threading.Thread(
+                target=self._produce, args=(key, entry, factory), name="singleflight-stream", daemon=True
+            )
+            thread.start()
+
+        position = 0
+        try:
+            while True:
+                with condition:
+                    while position >= len(stream.items) and not stream.finished:
+                        condition.wait()
+                    if position < len(stream.items):
+                        item = stream.items[position]
+                        position += 1
+                    elif stream.error is not None:
+                        raise stream.error
+                    else:
+                        return
+                yield item
+        finally:
+            self._unsubscribe(self._streams, key, entry)
+
+    def _unsubscribe(self, streams, key, entry):
+        """Drop a consumer; the last one to leave an unfinished stream cancels it."""
+        stream = entry[0]
+        with self._lock:
+            stream.subscribers -= 1
+            if stream.subscribers or stream.finished:
+                return False
+            stream.cancelled = True
+            # Callers arriving from now on start a fresh call.
+            if streams.get(key) is entry:
+                del streams[key]
+        return True
+
+    def _produce(self, key, entry, factory):
+        stream, condition = entry
+        iterator = None
+        try:
+            iterator = factory()
+            for item in iterator:
+                if stream.cancelled:
+                    break
+                with condition:
+                    stream.items.append(item)
+                    condition.notify_all()
+        except BaseException as e:
+            stream.error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._streams.get(key) is entry:
+                    del self._streams[key]
+            with condition:
+                stream.finished = True
+                condition.notify_all()
+
+    async def ado(self, key, func, *args, **kwargs):
+        """Coroutine version of do(); func(*args, **kwargs) must return an awaitable."""
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        self._count(task is not None)
+        if task is None:
+            task = loop.create_task(func(*args, **kwargs))
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        # A cancelled caller must not cancel the call the others are waiting on.
+        return await asyncio.shield(task)
+
+    async def ado_stream(self, key, factory):
+        """Async generator version of do_stream(); factory() returns an async iterator."""
+        loop = asyncio.get_running_loop()
+        stream_key = (id(loop), key)
+        entry = self._async_streams.get(stream_key)
+        self._count(entry is not None)
+        if entry is None:
+            entry = self._async_streams[stream_key] = (_Stream(), asyncio.Condition())
+            task = entry[0].producer = loop.create_task(self._aproduce(stream_key, entry, factory))
+            # The loop only keeps weak references to tasks.
+            self._producers.add(task)
+            task.add_done_callback(self._producers.discard)
+        stream, condition = entry
+        with self._lock:
+            stream.subscribers += 1
+
+        position = 0
+        try:
+            while True:
+                async with condition:
+                    await condition.wait_for(lambda: position < len(stream.items) or stream.finished)
+                    if position < len(stream.items):
+                        item = stream.items[position]
+                        position += 1
+                    elif stream.error is not None:
+                        raise stream.error
+                    else:
+                        return
+                yield item
+        finally:
+            if self._unsubscribe(self._async_streams, stream_key, entry):
+                stream.producer.cancel()
+
+    async def _aproduce(self, stream_key, entry, factory):
+        stream, condition = entry
+        try:
+            async for item in factory():
+                async with condition:
+                    stream.items.append(item)
+                    condition.notify_all()
+        except asyncio.CancelledError:
+            if not stream.cancelled:
+                stream.error = asyncio.CancelledError()
+            raise
+        except BaseException as e:
+            stream.error = e
+        finally:
+            if self._async_streams.get(stream_key) is entry:
+                del self._async_streams[stream_key]
+            async with condition:
+                stream.finished = True
+                condition.notify_all()
+
+
+single_flight = SingleFlight()
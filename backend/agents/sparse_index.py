@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix, vstack
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_ARRAYS = ("terms", "idf", "data", "indices", "indptr")
+SCORINGS = ("tfidf", "bm25")
+
+# Same defaults as sklearn's vectorizers, which build the index.
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+VECTORIZER_PARAMS = ("max_features", "stop_words", "min_df", "max_df")
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def index_config(params):
+    """Key prefix shared by every index built with params in this format version."""
+    return _digest({"version": INDEX_VERSION, "params": params})[:16]
+
+
+def index_key(content_hash, params):
+    """Identify an index as <config>-<catalog>: build parameters and format version, then content."""
+    return f"{index_config(params)}-{_digest(content_hash)[:32]}"
+
+
+class SparseIndex:
+    """Weighted document-term index over the project catalog, stored as plain arrays.
+
+    The matrix is kept term-major (CSC): column t lists the documents that
+    contain term t with their precomputed weight, i.e. it is the inverted
+    index. Two weightings are supported:
+
+    - "tfidf": L2-normalized TF-IDF rows, as sklearn's TfidfVectorizer; the
+      query is vectorized the same way, so scores are cosine similarities.
+    - "bm25": Okapi BM25 term weights (k1, b); the query contributes its raw
+      term counts.
+
+    On disk an index is a directory named after its key holding meta.json and
+    one .npy file per array. Arrays are opened with mmap_mode="r", so loading
+    costs a few page faults instead of an unpickle, and forked workers share
+    the same pages. sklearn is only needed to build.
+    """
+
+    def __init__(self, terms, idf, matrix, meta):
+        self.terms = terms
+        self.idf = idf
+        self.matrix = matrix
+        self.meta = meta
+        self.scoring = meta["params"].get("scoring", "tfidf")
+        self.vocabulary = {str(term): col for col, term in enumerate(terms)}
+        self.stop_words = frozenset(meta.get("stop_words", ()))
+        self.token_re = re.compile(meta.get("token_pattern", TOKEN_PATTERN))
+
+    @property
+    def key(self):
+        return self.meta["key"]
+
+    @property
+    def n_docs(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, texts, params, key):
+        from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+        scoring = params.get("scoring", "tfidf")
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring {scoring!r}, expected one of {SCORINGS}")
+        vectorizer_params = {k: v for k, v in params.items() if k in VECTORIZER_PARAMS}
+
+        meta = {"version": INDEX_VERSION, "key": key, "params": params, "built_at": time.time()}
+        if scoring == "tfidf":
+            vectorizer = TfidfVectorizer(**vectorizer_params)
+            matrix = vectorizer.fit_transform(texts)
+            idf = vectorizer.idf_.astype(np.float64)
+        else:
+            vectorizer = CountVectorizer(**vectorizer_params)
+            counts = vectorizer.fit_transform(texts).tocsr().astype(np.float64)
+            k1, b = params.get("k1", 1.2), params.get("b", 0.75)
+            doc_len = np.asarray(counts.sum(axis=1)).ravel()
+            avgdl = doc_len.mean() if len(doc_len) else 0.0
+            df = np.bincount(counts.indices, minlength=counts.shape[1])
+            idf = np.log1p((counts.shape[0] - df + 0.5) / (df + 0.5))
+            matrix = cls._bm25_weights(counts, idf, doc_len, avgdl, k1, b)
+            meta["avgdl"] = float(avgdl)
+
+        terms = np.array(vectorizer.get_feature_names_out(), dtype=str)
+        meta.update({
+            "shape": list(matrix.shape),
+            "stop_words": sorted(vectorizer.get_stop_words() or ()),
+            "token_pattern": vectorizer.token_pattern,
+        })
+        return cls(terms, idf, csc_matrix(matrix), meta)
+
+    @staticmethod
+    def _bm25_weights(counts, idf, doc_len, avgdl, k1, b):
+        """Turn a CSR count matrix into per-(doc, term) BM25 contributions."""
+        tf = counts.data
+        row_len = np.repeat(doc_len, np.diff(counts.indptr))
+        norm = k1 * (1 - b + b * row_len / (avgdl or 1.0))
+        weights = counts.copy()
+        weights.data = idf[counts.indices] * tf * (k1 + 1) / (tf + norm)
+        return weights
+
+    def save(self, root):
+        """Write the index under root/<key>/ atomically and drop older builds of its configuration.
+
+        Only directories with this index's configuration prefix that are older
+        than it are removed: processes with other settings (say match_projects.py
+        with another scorer) share root and keep their own indexes.
+        """
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        target = root / self.key
+        tmp = Path(tempfile.mkdtemp(prefix=".building-", dir=root))
+        try:
+            arrays = {
+                "terms": self.terms,
+                "idf": self.idf,
+                "data": self.matrix.data,
+                "indices": self.matrix.indices,
+                "indptr": self.matrix.indptr,
+            }
+            for name, array in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+            with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                # Another worker published the same key first; theirs is identical.
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        config = self.key.split("-", 1)[0] + "-"
+        try:
+            current = target.stat().st_mtime
+            for stale in root.iterdir():
+                # Unprefixed 64-hex names are builds from before keys had a configuration prefix.
+                ours = stale.name.startswith(config) or (len(stale.name) == 64 and "-" not in stale.name)
+                if ours and stale.name != self.key and stale.is_dir() and stale.stat().st_mtime < current:
+                    shutil.rmtree(stale, ignore_errors=True)
+        except OSError as e:
+            logger.warning(f"Could not prune old project indexes: {e}")
+        return target
+
+    @classmethod
+    def load(cls, root, key):
+        """Open root/<key>/ memory-mapped, or return None if it doesn't exist or is unreadable."""
+        directory = Path(root) / key
+        if not directory.is_dir():
+            return None
+        with open(directory / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION or meta.get("key") != key:
+            return None
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+            for name in INDEX_ARRAYS
+        }
+        matrix = csc_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return cls(arrays["terms"], arrays["idf"], matrix, meta)
+
+    def analyze(self, text):
+        return [
+            token for token in self.token_re.findall(text.lower())
+            if token not in self.stop_words
+        ]
+
+    def query_weights(self, text):
+        """Return (term columns, weights) for a query, sorted by column."""
+        counts = {}
+        for token in self.analyze(text):
+            col = self.vocabulary.get(token)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.scoring == "tfidf":
+            weights *= self.idf[cols]
+            norm = np.sqrt(np.dot(weights, weights))
+            if norm:
+                weights /= norm
+        order = np.argsort(cols)
+        return cols[order], weights[order]
+
+    def transform(self, texts):
+        """Stack query_weights() of many texts into one CSR query matrix."""
+        data, indices, indptr = [], [], [0]
+        for text in texts:
+            cols, weights = self.query_weights(text)
+            indices.append(cols)
+            data.append(weights)
+            indptr.append(indptr[-1] + len(cols))
+        return csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(len(texts), len(self.terms)),
+        )
+
+    def vectorize(self, texts):
+        """Document rows for texts against this index's vocabulary and idf, as CSR.
+
+        Terms outside the vocabulary are dropped and idf (and avgdl for BM25)
+        stay as built, so the rows line up with the existing ones.
+        """
+        data, indices, indptr = [], [], [0]
+        k1, b = self.meta["params"].get("k1", 1.2), self.meta["params"].get("b", 0.75)
+        for text in texts:
+            counts = {}
+            for token in self.analyze(text):
+                col = self.vocabulary.get(token)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+            cols = np.array(sorted(counts), dtype=np.int64)
+            tf = np.array([counts[col] for col in cols], dtype=np.float64)
+            if self.scoring == "tfidf":
+                weights = tf * self.idf[cols]
+                norm = np.sqrt(np.dot(weights, weights))
+                if norm:
+                    weights /= norm
+            else:
+                norm = k1 * (1 - b + b * tf.sum() / (self.meta.get("avgdl") or 1.0))
+                weights = self.idf[cols] * tf * (k1 + 1) / (tf + norm)
+            indices.append(cols)
+            data.append(weights)
+            indptr.append(indptr[-1] + len(cols))
+        return csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(len(texts), len(self.terms)),
+        )
+
+    def updated(self, sources, texts, key):
+        """Return a new index with one row per entry of sources.
+
+        sources[i] is the row of this index to reuse, or None to take the next
+        entry of texts, which is vectorized with vectorize(). This index is
+        left untouched, so readers holding it keep a consistent view.
+        """
+        fresh = self.vectorize(texts)
+        combined = vstack([self.matrix.tocsr(), fresh], format="csr")
+        order, next_fresh = [], self.n_docs
+        for row in sources:
+            if row is None:
+                order.append(next_fresh)
+                next_fresh += 1
+            else:
+                order.append(row)
+        matrix = combined[np.array(order, dtype=np.int64)]
+        meta = dict(
+            self.meta,
+            key=key,
+            shape=list(matrix.shape),
+            built_at=time.time(),
+            base_key=self.meta.get("base_key", self.key),
+        )
+        return SparseIndex(self.terms, self.idf, csc_matrix(matrix), meta)
@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """Startup timing of this process and the one-off warm-ups behind readiness.
+
+    mark() times the steps of loading the app (imports, agents, shared
+    models), each from the previous mark. Under a preloading gunicorn master
+    they run once before the workers fork, so every worker reports the
+    master's phases and its own fork time. warm() and awarm() run a warm-up, such as opening the LLM
+    connection pool, at most once per worker process; concurrent readiness
+    probes wait for the one in progress.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.pid = os.getpid()
+        self.preloaded = False
+        self.forked_at = None
+        self.phases = {}
+        self._last = self.started
+        self._warmed = {}
+        self._lock = threading.Lock()
+        self._async_lock = None
+
+    def mark(self, name):
+        """Record the time since the previous mark (or since this module loaded) as phase `name`."""
+        now = time.perf_counter()
+        self.phases[name] = round(now - self._last, 4)
+        self._last = now
+
+    def loaded(self):
+        """Record the total load time and log the phases."""
+        self.phases["total"] = round(time.perf_counter() - self.started, 4)
+        logger.info(f"App loaded in {self.phases['total']:.2f}s: {self.phases}")
+
+    def after_fork(self):
+        """Reset per-process state in a worker forked from a preloaded master."""
+        self.pid = os.getpid()
+        self.preloaded = True
+        self.forked_at = time.time()
+        self._warmed = {}
+        self._lock = threading.Lock()
+        self._async_lock = None
+
+    def _record(self, name, started, error):
+        self._warmed[name] = {"seconds": round(time.perf_counter() - started, 4), "ok": error is None}
+        if error is not None:
+            self._warmed[name]["error"] = f"{type(error).__name__}: {error}"
+            logger.warning(f"Warm-up {name} failed: {error}")
+
+    def warm(self, name, fn):
+        """Run fn() once per process; failures are recorded, not raised."""
+        if name in self._warmed:
+            return
+        with self._lock:
+            if name in self._warmed:
+                return
+            started, error = time.perf_counter(), None
+            try:
+                fn()
+            except Exception as e:
+                error = e
+            self._record(name, started, error)
+
+    async def awarm(self, name, fn):
+        """Async warm(): awaits fn() once per process."""
+        if name in self._warmed:
+            return
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if name in self._warmed:
+                return
+            started, error = time.perf_counter(), None
+            try:
+                await fn()
+            except Exception as e:
+                error = e
+            self._record(name, started, error)
+
+    def report(self):
+        return {
+            "pid": self.pid,
+            "preloaded": self.preloaded,
+            "started_at": self.started_at,
+            "forked_at": self.forked_at,
+            "uptime_seconds": round(time.time() - (self.forked_at or self.started_at), 3),
+            "phases": dict(self.phases),
+            "warm_up": dict(self._warmed),
+        }
+
+
+startup = Startup()
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+import requests
+from .singleflight import single_flight, flight_key
+from .metrics import stage, SEARCH_CACHE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "data" / "search_cache.sqlite3"
+# Quotes and end-of-sentence punctuation don't change what the search engine returns.
+QUERY_TRIM = " \t\"'«»“”.,;:!?"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    query TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    results TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (query, max_results)
+);
+CREATE INDEX IF NOT EXISTS searches_last_access ON searches (last_access);
+"""
+
+
+def normalize_query(query):
+    """Casefold, collapse whitespace and trim quotes and punctuation from the ends."""
+    return " ".join((query or "").casefold().split()).strip(QUERY_TRIM)
+
+
+class SearchCache:
+    """On-disk normalized query -> search results cache shared by all gunicorn workers.
+
+    Works like ImageCache: entries expire after `ttl` seconds, the table is
+    trimmed to `max_entries` by least recent access, and every thread of
+    every process opens its own WAL-mode connection. A lookup for fewer
+    results is served from an entry that holds more. Failures never break a
+    search; they count as a miss.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = str(path or os.getenv("WEB_SEARCH_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.ttl = float(ttl if ttl is not None else os.getenv("WEB_SEARCH_CACHE_TTL", 6 * 3600))
+        self.max_entries = int(max_entries or os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", 5000))
+        self.enabled = self.ttl > 0
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork: gunicorn workers reopen their own.
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, query, max_results):
+        """Return cached results for a normalized query, or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT max_results, results, last_access FROM searches "
+                "WHERE query = ? AND max_results >= ? AND expires_at > ? "
+                "ORDER BY max_results LIMIT 1",
+                (query, max_results, now),
+            ).fetchone()
+            if row is None:
+                return None
+            cached_max, results, last_access = row
+            # Refreshing recency on every hit would turn reads into writes.
+            if now - last_access > 60:
+                conn.execute(
+                    "UPDATE searches SET last_access = ? WHERE query = ? AND max_results = ?",
+                    (now, query, cached_max),
+                )
+            return json.loads(results)[:max_results]
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache read failed: {e}")
+            return None
+
+    def set(self, query, max_results, results):
+        if not self.enabled or not results:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (query, max_results, results, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (query, max_results, json.dumps(results, ensure_ascii=False), now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache write failed: {e}")
+
+    def evict(self):
+        """Drop expired rows, then the least recently used ones above max_entries."""
+        conn = self._connect()
+        conn.execute("DELETE FROM searches WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM searches WHERE rowid IN ("
+            "SELECT rowid FROM searches ORDER BY last_access "
+            "LIMIT max(0, (SELECT COUNT(*) FROM searches) - ?))",
+            (self.max_entries,),
+        )
+
+
+class WebSearch:
+    """Web search shared by the research and copywriter agents.
+
+    Queries are normalized before anything else, so "Latest UX trends?" and
+    "latest  ux trends" are one search. Results come from the SearchCache
+    when possible; otherwise identical concurrent searches share one DDGS
+    request, and each thread keeps its DDGS client (and its connections)
+    between searches instead of opening a new one every time. Empty results
+    and failures are not cached. WEB_SEARCH_URL replaces DDGS with an HTTP
+    endpoint returning DDGS-shaped JSON (see bench/stubs.py).
+    """
+
+    def __init__(self, cache=None, search_url=None):
+        self.cache = cache or SearchCache()
+        self.search_url = search_url if search_url is not None else os.getenv("WEB_SEARCH_URL")
+        self._local = threading.local()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def search(self, query, max_results=5, timeout=10):
+        """Return up to max_results DDGS-style {"title", "href", "body"} dicts, [] on failure."""
+        normalized = normalize_query(query)
+        if not normalized:
+            return []
+        with stage("search"):
+            cached = self.cache.get(normalized, max_results)
+            if cached is not None:
+                SEARCH_CACHE.inc(result="hit")
+                self._count("hits")
+                return cached
+            SEARCH_CACHE.inc(result="miss")
+            self._count("misses")
+
+            try:
+                key = flight_key("web_search", normalized, max_results)
+                return list(single_flight.do(key, self._fetch_and_store, normalized, max_results, timeout))
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Web search failed for {normalized!r}: {e}")
+                return []
+
+    def _fetch_and_store(self, query, max_results, timeout):
+        results = self._fetch(query, max_results, timeout)
+        self.cache.set(query, max_results, results)
+        return results
+
+    def _fetch(self, query, max_results, timeout):
+        if self.search_url:
+            response = requests.get(self.search_url, params={"q": query, "max_results": max_results}, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        return list(self._client(timeout).text(query, max_results=max_results))
+
+    def _client(self, timeout):
+        """This thread's DDGS client for timeout, created on first use in this process."""
+        clients = getattr(self._local, "clients", None)
+        if clients is None or self._local.pid != os.getpid():
+            clients = self._local.clients = {}
+            self._local.pid = os.getpid()
+        client = clients.get(timeout)
+        if client is None:
+            # Imported on first use: ddgs pulls in primp and lxml, which startup doesn't need.
+            from ddgs import DDGS
+            client = clients[timeout] = DDGS(timeout=timeout)
+        return client
+
+    def stats(self):
+        """Cache hits and misses and failed searches in this worker."""
+        with self._lock:
+            return dict(self._stats)
+
+
+_web_search = None
+_web_search_lock = threading.Lock()
+
+
+def get_web_search():
+    """Return the process-wide WebSearch, creating it on first use (after .env is loaded)."""
+    global _web_search
+    if _web_search is None:
+        with _web_search_lock:
+            if _web_search is None:
+                _web_search = WebSearch()
+    return _web_search
@@ -1,19 +1,40 @@
 import os
 import json
-import requests
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from lingua import Language, LanguageDetectorBuilder
+from .llm_client import get_llm_client, get_async_llm_client
+from .language import detect_language
+from .audience_classifier import AudienceClassifier
+from .fact_matcher import FactMatcher
+from .history import compact_history, messages_tokens
+from .metrics import stage
 
 class WelcomeAgent:
+    GENERATION_PARAMS = {
+        "timeout": 25,
+        "temperature": 0.6,
+        "max_tokens": 800,
+        "top_p": 0.95
+    }
+    AUDIENCE_PARAMS = {
+        "model": "llama3-8b-8192",
+        "timeout": 10,
+        "temperature": 0.6,
+        "max_tokens": 15
+    }
+
     def __init__(self, default_model="llama3-8b-8192"):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.default_model = default_model
-        self.language_detector = LanguageDetectorBuilder.from_languages(
-            Language.ENGLISH, Language.RUSSIAN, Language.UKRAINIAN
-        ).build()
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable not set")
+        self.llm = get_llm_client()
         self.company_data = self._load_company_data()
+        self.audience_classifier = AudienceClassifier(self.company_data)
+        self.fact_matcher = FactMatcher(self.company_data)
+        self._llm_audiences = OrderedDict()
+        self._llm_audiences_lock = threading.Lock()
 
     def _load_company_data(self):
         data_dir = Path(__file__).parent.parent / "data"
@@ -26,11 +47,7 @@ class WelcomeAgent:
             return {}
 
     def _detect_language(self, text):
-        try:
-            lang = self.language_detector.detect_language_of(text)
-            return lang.iso_code_639_1.name.lower()
-        except:
-            return "en"
+        return detect_language(text)
 
     def _format_audience_info(self, audience_type):
         """Format audience-specific information for the prompt"""
@@ -70,23 +87,11 @@ class WelcomeAgent:
         """Extract already mentioned facts from conversation history"""
         if not chat_history:
             return "None"
-        
-        mentioned = set()
-        for msg in chat_history:
-            if msg["role"] == "assistant":
-                content = msg["content"].lower()
-                # Check against all possible facts
-                for audience in self.company_data.values():
-                    for fact in audience.get("key_points", []) + audience.get("achievements", []):
-                        if any(word in content for word in fact.lower().split()[:3]):      mentioned.add(fact)
-        
-        return ", ".join(list(mentioned)[:5]) + ("..." if len(mentioned) > 5 else "")
+
+        mentioned = self.fact_matcher.mentioned(chat_history)
+        return ", ".join(mentioned[:5]) + ("..." if len(mentioned) > 5 else "")
     
-    def get_response(self, query, model=None, chat_history=None):
-        model = model or self.default_model
-        lang = self._detect_language(query)
-        
-        audience_type = self._detect_audience_type(query, lang)
+    def _build_messages(self, query, chat_history, lang, audience_type, model):
         audience_info = self._format_audience_info(audience_type)
         
         system_prompt = (
@@ -132,63 +137,168 @@ class WelcomeAgent:
 
 
         messages = [{"role": "system", "content": system_prompt}]
-        
+        prompt = messages + [{"role": "user", "content": query}]
+
         if chat_history:
-            messages += chat_history
-            
+            reserved = messages_tokens(prompt) + self.GENERATION_PARAMS["max_tokens"]
+            messages += compact_history(chat_history, model, reserved)[0]
+
         messages.append({"role": "user", "content": query})
+        return messages
 
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.6,
-            "max_tokens": 800,
-            "top_p": 0.95
-        }
+    def get_response(self, query, model=None, chat_history=None, session=None):
+        model = model or self.default_model
+        lang = self._session_language(query, session)
+        audience_type = self._resolve_audience_type(query, chat_history, lang, session)
+        messages = self._build_messages(query, chat_history, lang, audience_type, model)
 
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=25
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            return self.llm.complete(messages, model=model, cache="welcome", priority="interactive", **self.GENERATION_PARAMS)
         except Exception as e:
             return f"Error: {str(e)}"
+
+    async def aget_response(self, query, model=None, chat_history=None, session=None):
+        """Non-blocking get_response for the ASGI app."""
+        model = model or self.default_model
+        lang = self._session_language(query, session)
+        audience_type = await self._aresolve_audience_type(query, chat_history, lang, session)
+        messages = self._build_messages(query, chat_history, lang, audience_type, model)
+
+        try:
+            return await get_async_llm_client().complete(messages, model=model, cache="welcome", priority="interactive", **self.GENERATION_PARAMS)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def stream_response(self, query, model=None, chat_history=None, session=None):
+        """Yield ("token", text) events as the answer is generated, then ("done", meta)."""
+        model = model or self.default_model
+        lang = self._session_language(query, session)
+        audience_type = self._resolve_audience_type(query, chat_history, lang, session)
+        messages = self._build_messages(query, chat_history, lang, audience_type, model)
+
+        try:
+            for chunk in self.llm.stream(messages, model=model, cache="welcome", priority="interactive", **self.GENERATION_PARAMS):
+                yield "token", chunk
+        except Exception as e:
+            yield "error", {"error": f"Error: {str(e)}"}
+            return
+        yield "done", {}
     
-    def _detect_audience_type(self, query, lang):
-        """Detect audience type using LLM classification"""
-        prompt = (
+    def _classify_conversation(self, query, chat_history):
+        """Return the audience of the first confidently classified user turn.
+
+        Earlier turns win, so once a conversation is classified the label sticks
+        even if later questions drift. Returns (None, query) when no turn is
+        conclusive and the LLM fallback is needed: the latest turn is the one
+        most likely to say who is asking, and an answer cached for an earlier
+        turn must not hide it.
+        """
+        user_messages = [
+            msg["content"] for msg in chat_history or [] if msg.get("role") == "user"
+        ]
+        user_messages.append(query)
+        for text in user_messages:
+            audience, confidence = self.audience_classifier.classify(text)
+            if self.audience_classifier.is_confident(confidence):
+                return audience, None
+        return None, query
+
+    def _cached_llm_audience(self, text):
+        with self._llm_audiences_lock:
+            audience = self._llm_audiences.get(text)
+            if audience is not None:
+                self._llm_audiences.move_to_end(text)
+            return audience
+
+    def _remember_llm_audience(self, text, audience, session=None):
+        """Memoize the LLM's answer for text and let it stick for the session, like a local one."""
+        with self._llm_audiences_lock:
+            self._llm_audiences[text] = audience
+            self._llm_audiences.move_to_end(text)
+            if len(self._llm_audiences) > 2048:
+                self._llm_audiences.popitem(last=False)
+        if session is not None:
+            session["audience"] = audience
+        return audience
+
+    def _session_language(self, query, session):
+        """Language of query; a message without letters ("?", "100%") keeps the session's.
+
+        session, when given, is the server-side session dict and is updated in place.
+        """
+        if session and session.get("lang") and not any(c.isalpha() for c in query):
+            return session["lang"]
+        lang = self._detect_language(query)
+        if session is not None:
+            session["lang"] = lang
+        return lang
+
+    def _session_audience(self, query, chat_history, session):
+        """Audience stored in the session, else the first confident turn (stored for later turns).
+
+        The LLM fallback's answer is stored in the session too, so a
+        conversation is classified at most once either way.
+        """
+        if session and session.get("audience"):
+            return session["audience"], None
+        audience, fallback_text = self._classify_conversation(query, chat_history)
+        if audience and session is not None:
+            session["audience"] = audience
+        return audience, fallback_text
+
+    def _resolve_audience_type(self, query, chat_history, lang, session=None):
+        audience, fallback_text = self._session_audience(query, chat_history, session)
+        if audience:
+            return audience
+        audience = self._cached_llm_audience(fallback_text)
+        if audience is None:
+            audience = self._detect_audience_type(fallback_text, lang)
+        return self._remember_llm_audience(fallback_text, audience, session)
+
+    async def _aresolve_audience_type(self, query, chat_history, lang, session=None):
+        audience, fallback_text = self._session_audience(query, chat_history, session)
+        if audience:
+            return audience
+        audience = self._cached_llm_audience(fallback_text)
+        if audience is None:
+            audience = await self._adetect_audience_type(fallback_text, lang)
+        return self._remember_llm_audience(fallback_text, audience, session)
+
+    def _audience_prompt(self, query):
+        return (
             f"Classify the user type based on this message: '{query}'\n"
             "Options: client, designer, developer, other\n"
             "Respond ONLY with the single most relevant audience type."
         )
-        
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.6,
-            "max_tokens": 15
-        }
 
+    def _parse_audience(self, result):
+        result = result.lower()
+        for audience in ["client", "designer", "developer"]:
+            if audience in result:
+                return audience
+        return "other"
+
+    def _detect_audience_type(self, query, lang):
+        """Detect audience type using LLM classification (fallback for inconclusive messages)"""
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            result = response.json()["choices"][0]["message"]["content"].lower()
-            
-            for audience in ["client", "designer", "developer"]:
-                if audience in result:
-                    return audience
+            with stage("audience"):
+                result = self.llm.complete(
+                    [{"role": "user", "content": self._audience_prompt(query)}],
+                    priority="interactive",
+                    **self.AUDIENCE_PARAMS
+                )
+            return self._parse_audience(result)
+        except:
             return "other"
+
+    async def _adetect_audience_type(self, query, lang):
+        try:
+            with stage("audience"):
+                result = await get_async_llm_client().complete(
+                    [{"role": "user", "content": self._audience_prompt(query)}],
+                    priority="interactive",
+                    **self.AUDIENCE_PARAMS
+                )
+            return self._parse_audience(result)
         except:
             return "other"
-        
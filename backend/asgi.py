@@ -0,0 +1,195 @@
+import contextlib
+from dotenv import load_dotenv
+
+# As in main: the agents modules imported below (the model router among them)
+# read their settings when they load, before main gets to load .env.
+load_dotenv()
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from agents.llm_client import get_async_llm_client
+from agents.concurrency import run_blocking
+from agents.model_router import served_models
+from agents.metrics import start_request, HTTP_SECONDS
+from agents.startup import startup
+from main import (
+    app as flask_app,
+    welcome_agent,
+    research_agent,
+    copywriter_agent,
+    project_agent,
+    LENGTH_MAPPING,
+    _open_session,
+    UnknownSession,
+    _save_turn,
+    _served_model,
+    _agent_for_path,
+    readiness_report,
+)
+
+# Asyncio entry point: `uvicorn asgi:app` or
+# `gunicorn asgi:app -k uvicorn.workers.UvicornWorker`.
+# The four agent endpoints and /readyz run natively on the event loop; every
+# other route (streaming variants, admin endpoints) is served by the Flask app.
+
+
+async def handle_welcome(request):
+    data = await request.json()
+    user_message = data.get('message', '').strip()
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = await run_blocking(_open_session, 'welcome', data)
+
+    with served_models() as served:
+        response = await welcome_agent.aget_response(
+            query=user_message,
+            model=model,
+            chat_history=session['history'],
+            session=session
+        )
+    await run_blocking(_save_turn, 'welcome', session_id, session, user_message, response)
+
+    return JSONResponse({'response': response, 'model': _served_model(served, model), 'session_id': session_id})
+
+
+async def research_agent_endpoint(request):
+    data = await request.json()
+    message = data.get('message', '')
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = await run_blocking(_open_session, 'research', data)
+
+    with served_models() as served:
+        response = await research_agent.asearch_web(
+            message,
+            model=model,
+            chat_history=session['history'])
+    await run_blocking(_save_turn, 'research', session_id, session, message, response)
+
+    return JSONResponse({'response': response, 'model': _served_model(served, model), 'session_id': session_id})
+
+
+async def copywriter_agent_endpoint(request):
+    try:
+        data = await request.json()
+        message = data.get('message', '').strip()
+        length_chars = LENGTH_MAPPING.get(data.get('length', 'medium'), 5000)
+        model = data.get('model') or copywriter_agent.default_model
+
+        if len(message) < 15:
+            return JSONResponse({'error': 'Topic must be at least 15 characters'}, status_code=400)
+
+        session_id, session = await run_blocking(_open_session, 'copywriter', data)
+        with served_models() as served:
+            html_content = await copywriter_agent.awrite_article(
+                topic=message,
+                length=length_chars,
+                tone=data.get('tone', 'neutral'),
+                audience=data.get('audience', 'general public'),
+                chat_history=session['history'],
+                model=model,
+                mode=data.get('mode'),
+                section_length=data.get('section_length')
+            )
+
+        if len(html_content) < length_chars * 0.5:
+            flask_app.logger.warning(f"Short article generated: {len(html_content)}/{length_chars} chars")
+        await run_blocking(_save_turn, 'copywriter', session_id, session, message, html_content)
+
+        return JSONResponse({'response': html_content, 'model': _served_model(served, model), 'session_id': session_id})
+
+    except UnknownSession:
+        raise
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def handle_project(request):
+    data = await request.json()
+    user_message = data.get('message', '').strip()
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = await run_blocking(_open_session, 'project', data)
+
+    with served_models() as served:
+        result = await project_agent.aget_response(
+            query=user_message,
+            model=model,
+            chat_history=session['history'],
+            shown_project_ids=session['shown_project_ids']
+        )
+    await run_blocking(_save_turn, 'project', session_id, session, user_message,
+                       result["text"], result.get("project_ids"))
+
+    return JSONResponse({
+        'response': result["text"],
+        'project_ids': result.get("project_ids", []),
+        'model': _served_model(served, model),
+        'session_id': session_id
+    })
+
+
+async def readiness(request):
+    """Readiness probe; also opens the async pool the native routes use (see main.readiness)."""
+    await startup.awarm('llm_async_pool', get_async_llm_client().awarm)
+    return JSONResponse(await run_blocking(readiness_report))
+
+
+class ServerTimingMiddleware:
+    """Server-Timing header and latency histogram for the natively served routes.
+
+    Requests handed to the Flask app get both from Flask's own hooks, so a
+    response that already carries the header is passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = start_request(_agent_for_path(scope["path"]))
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "server-timing" not in headers:
+                    headers.append("Server-Timing", timing.header())
+                    HTTP_SECONDS.observe(timing.elapsed(), endpoint=scope["path"], method=scope["method"],
+                                         status=message["status"])
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+async def unknown_session(request, exc):
+    """Same 409 as main's handler for the natively served routes."""
+    return JSONResponse({'error': 'Unknown or expired session', 'session_expired': True, 'session_id': str(exc)},
+                        status_code=409)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await get_async_llm_client().aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/welcome', handle_welcome, methods=['POST']),
+        Route('/api/research', research_agent_endpoint, methods=['POST']),
+        Route('/api/copywriter', copywriter_agent_endpoint, methods=['POST']),
+        Route('/api/project', handle_project, methods=['POST']),
+        Route('/readyz', readiness, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(ServerTimingMiddleware),
+    ],
+    exception_handlers={UnknownSession: unknown_session},
+    lifespan=lifespan,
+)
@@ -0,0 +1,205 @@
+"""Drive the agent endpoints at a fixed concurrency and report latency percentiles.
+
+Workers pick endpoints from the mix (weighted, "welcome=4,project=3,research=2,copywriter=1")
+and send requests back to back until the duration or request count is reached.
+Point the backend at bench/stubs.py first so runs cost nothing:
+
+    python bench/loadgen.py --url http://127.0.0.1:5000 --concurrency 50 --duration 60
+
+With --stream the /stream variants are used and time to first token is
+reported too. --unique makes every message distinct, defeating the response,
+search and image caches.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+
+import httpx
+
+MESSAGES = {
+    "welcome": ["Hi, what does your studio do?", "Can you help me build a mobile app?",
+                "How much does a website redesign cost?", "Do you work with startups?"],
+    "project": ["Fintech dashboard with real-time charts", "E-commerce mobile app for a fashion brand",
+                "Healthcare patient portal", "Landing page for a SaaS launch"],
+    "research": ["Latest trends in UX design", "Best practices for onboarding flows",
+                 "How are companies using AI in customer support?", "State of the no-code market"],
+    "copywriter": ["Why design systems save product teams time", "A guide to accessible web forms for startups",
+                   "How to plan a successful product launch", "Remote collaboration tips for design teams"],
+}
+ENDPOINTS = tuple(MESSAGES)
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in MESSAGES:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.first_tokens = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def add(self, endpoint, seconds, status, ttft=None, error=False):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if ttft is not None:
+            self.first_tokens.setdefault(endpoint, []).append(ttft)
+        if error:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        statuses = self.statuses.setdefault(endpoint, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            row = {
+                "requests": len(latencies),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                "statuses": self.statuses[endpoint],
+            }
+            for pct in (50, 95, 99):
+                row[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 1)
+            if endpoint in self.first_tokens:
+                for pct in (50, 95, 99):
+                    row[f"ttft_p{pct}_ms"] = round(percentile(self.first_tokens[endpoint], pct) * 1000, 1)
+            report[endpoint] = row
+        return report
+
+
+def build_request(endpoint, message, stream):
+    body = {"message": message}
+    if endpoint == "copywriter":
+        body["length"] = "short"
+    path = f"/api/{endpoint}" + ("/stream" if stream else "")
+    return path, body
+
+
+async def _send(client, path, body, stream):
+    """(status, ttft, failed) for one request; stream bodies are read to the end."""
+    if not stream:
+        response = await client.post(path, json=body)
+        return response.status_code, None, response.status_code >= 400
+    started = time.perf_counter()
+    ttft = None
+    failed = False
+    event = None
+    async with client.stream("POST", path, json=body) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            return response.status_code, None, True
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event == "error":
+                    failed = True
+    return response.status_code, ttft, failed
+
+
+async def worker(client, args, results, deadline, counter, weights):
+    endpoints, probabilities = zip(*weights.items())
+    while time.monotonic() < deadline:
+        sent = next(counter)
+        if args.requests and sent >= args.requests:
+            return
+        endpoint = random.choices(endpoints, probabilities)[0]
+        message = random.choice(MESSAGES[endpoint])
+        if args.unique:
+            message = f"{message} (#{sent})"
+        path, body = build_request(endpoint, message, args.stream)
+        started = time.perf_counter()
+        try:
+            status, ttft, failed = await _send(client, path, body, args.stream)
+        except httpx.HTTPError as e:
+            status, ttft, failed = type(e).__name__, None, True
+        results.add(endpoint, time.perf_counter() - started, status, ttft, failed)
+
+
+async def run(args):
+    results = Results()
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = time.monotonic() + (args.duration if args.duration else float("inf"))
+        await asyncio.gather(*(
+            worker(client, args, results, deadline, counter, args.mix)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def print_report(report, elapsed, concurrency):
+    total = sum(row["requests"] for row in report.values())
+    print(f"{total} requests in {elapsed:.1f}s at concurrency {concurrency} ({total / elapsed:.1f} req/s)\n")
+    header = f"{'endpoint':<12}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    streamed = any("ttft_p50_ms" in row for row in report.values())
+    if streamed:
+        header += f"{'ttft p50':>10}{'ttft p95':>10}"
+    print(header)
+    for endpoint, row in report.items():
+        line = (f"{endpoint:<12}{row['requests']:>9}{row['errors']:>8}{row['throughput_rps']:>8}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+        if streamed:
+            line += f"{row.get('ttft_p50_ms', '-'):>10}{row.get('ttft_p95_ms', '-'):>10}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="backend base URL")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight (default: 10)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run; 0 to rely on --requests")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("welcome=4,project=3,research=2,copywriter=1"),
+                        help="endpoint weights (default: welcome=4,project=3,research=2,copywriter=1)")
+    parser.add_argument("--stream", action="store_true", help="use the /stream endpoints")
+    parser.add_argument("--unique", action="store_true", help="make every message distinct")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout, seconds")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable mixes")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    if not args.duration and not args.requests:
+        parser.error("give --duration or --requests")
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    results, elapsed = asyncio.run(run(args))
+    report = results.summary(elapsed)
+    print_report(report, elapsed, args.concurrency)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "url": args.url,
+                "concurrency": args.concurrency,
+                "stream": args.stream,
+                "elapsed_seconds": round(elapsed, 2),
+                "endpoints": report,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Micro-benchmarks for the CPU-bound work done on every request.
+
+Covers project retrieval and index loading over synthetic catalogs, language
+detection, mentioned-fact tracking and prompt assembly over long chat
+histories, and image placeholder injection. Nothing here calls an upstream.
+Run from the backend directory:
+
+    python -m bench.micro --sizes 1000,10000,100000 -o results.json
+    python -m bench.micro --baseline results.json --threshold 0.25
+
+Each benchmark reports the median and best time per call. With --baseline the
+run exits with status 1 when any benchmark's median is slower than the
+baseline's by more than --threshold (0.25 = 25%).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import platform
+import tempfile
+import statistics
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+
+from agents import history, language
+from agents.fact_matcher import FactMatcher
+from agents.sparse_index import SparseIndex
+from agents.retrieval import SparseRetriever
+from agents.project_catalog import ProjectCatalog, DATA_DIR
+from agents.image_injector import StreamingImageInjector
+
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_TURNS = "20,200"
+QUERIES = [
+    "We need a fintech dashboard with real-time analytics and a mobile app",
+    "Looking for branding and a Webflow website for our SaaS startup",
+    "Healthcare patient portal, UX research and design system",
+    "E-commerce redesign for a fashion brand with better conversion",
+    "AI platform for logistics, we need UX/UI and React development",
+]
+TEXTS = {
+    "latin": "Hi! We are planning a redesign of our marketing website and want to talk about timelines.",
+    "cyrillic_script": "Привіт! Ми плануємо редизайн нашого сайту і хочемо обговорити терміни.",
+    "cyrillic_lingua": "Привет, нам нужен сайт для компании и мобильное приложение.",
+}
+
+
+class InlineExecutor:
+    """Runs submitted lookups on the spot, so only the injector's own work is timed."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def fake_lookup(keywords, per_page=5):
+    slug = "-".join(keywords)
+    return [f"https://images.example.com/{slug}/{i}.jpg" for i in range(per_page)]
+
+
+def _vocabulary(rng):
+    """Keywords, industries and services from the real catalog, padded with synthetic terms."""
+    with open(DATA_DIR / "projects.json", "r", encoding="utf-8") as f:
+        projects = json.load(f)
+    pools = {field: sorted({v for p in projects for v in p.get(field) or ()}) for field in
+             ("industry", "services", "keywords")}
+    pools["keywords"] += [f"term{i}" for i in range(2000)]
+    pools["names"] = [p["name"] for p in projects] + [f"Project{rng.randrange(10**6)}" for _ in range(500)]
+    return pools
+
+
+def synthetic_projects(count, seed=0):
+    rng = random.Random(seed)
+    pools = _vocabulary(rng)
+    projects = []
+    for i in range(count):
+        keywords = rng.sample(pools["keywords"], 12)
+        projects.append({
+            "id": str(i + 1),
+            "name": f"{rng.choice(pools['names'])} {i}",
+            "industry": rng.sample(pools["industry"], 2),
+            "services": rng.sample(pools["services"], 3),
+            "keywords": keywords,
+            "slogan": " ".join(keywords[:5]).capitalize(),
+            "description": " ".join(keywords).capitalize() + ".",
+            "timeline": f"{rng.randint(1, 18)} months",
+            "link": f"https://example.com/project/{i + 1}",
+        })
+    return projects
+
+
+def synthetic_history(turns, facts, seed=0):
+    """turns user/assistant pairs; assistant replies are HTML that mention welcome.json facts."""
+    rng = random.Random(seed)
+    history_messages = []
+    for turn in range(turns):
+        history_messages.append({"role": "user", "content": f"{rng.choice(QUERIES)} (turn {turn})"})
+        mentioned = " ".join(f"<li>{fact}</li>" for fact in rng.sample(facts, min(2, len(facts))))
+        history_messages.append({
+            "role": "assistant",
+            "content": f"<p>{rng.choice(QUERIES)}. Here is what we can offer.</p><ul>{mentioned}</ul>"
+                       f"<p>What would you like to build first?</p>",
+        })
+    return history_messages
+
+
+def synthetic_article(sections=12, seed=0):
+    rng = random.Random(seed)
+    words = ["design", "product", "users", "growth", "launch", "brand", "research", "interface", "team", "data"]
+    parts = ["<h1>Benchmark article</h1>"]
+    for i in range(sections):
+        parts.append(f"<h2>Section {i}</h2>")
+        parts.append("<p>" + " ".join(rng.choice(words) for _ in range(120)) + "</p>")
+        parts.append(f"<!--IMAGE_KEYWORDS: {', '.join(rng.sample(words, 3))}-->\n<!--IMAGE_HERE-->")
+    return "\n".join(parts)
+
+
+def measure(fn, min_time, repeat):
+    """Per-call seconds of `repeat` rounds, each looping fn long enough to last min_time / repeat."""
+    fn()
+    number, target = 1, min_time / repeat
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * target / max(elapsed, 1e-9)))
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return rounds, number
+
+
+class Suite:
+    def __init__(self, min_time, repeat, only=None):
+        self.min_time = min_time
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def run(self, name, fn, once=False):
+        """Time fn, or call it a single time when once=True (expensive one-shot work such as a build)."""
+        if not self.wanted(name):
+            return
+        if once:
+            started = time.perf_counter()
+            fn()
+            rounds, number = [time.perf_counter() - started], 1
+        else:
+            rounds, number = measure(fn, self.min_time, self.repeat)
+        self.results[name] = {
+            "median_us": round(statistics.median(rounds) * 1e6, 3),
+            "min_us": round(min(rounds) * 1e6, 3),
+            "rounds": len(rounds),
+            "number": number,
+        }
+        print(f"{name:<48}{self.results[name]['median_us']:>16,.1f} us  (best {self.results[name]['min_us']:,.1f})",
+              flush=True)
+
+
+def bench_retrieval(suite, sizes, workdir):
+    # Import sklearn up front so the first build isn't charged for it.
+    import sklearn.feature_extraction.text  # noqa: F401
+
+    for size in sizes:
+        names = ("index.build", "index.load", "index.catalog_load", "retrieval.search",
+                 "retrieval.search_excluding", "retrieval.match_batch_100")
+        if not any(suite.wanted(f"{name}[n={size}]") for name in names):
+            continue
+        root = Path(workdir) / f"catalog-{size}"
+        root.mkdir()
+        projects_path = root / "projects.json"
+        with open(projects_path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_projects(size), f)
+        index_root = root / "index"
+
+        built = {}
+        suite.run(f"index.build[n={size}]",
+                  lambda: built.setdefault("catalog", ProjectCatalog(projects_path=projects_path, index_root=index_root)),
+                  once=True)
+        catalog = built.get("catalog") or ProjectCatalog(projects_path=projects_path, index_root=index_root)
+        key = catalog.index.key
+        ids = [p["id"] for p in catalog.projects]
+
+        suite.run(f"index.load[n={size}]",
+                  lambda: SparseRetriever(SparseIndex.load(index_root, key), ids))
+        suite.run(f"index.catalog_load[n={size}]",
+                  lambda: ProjectCatalog(projects_path=projects_path, index_root=index_root), once=size > 100_000)
+
+        queries = itertools.cycle(QUERIES)
+        suite.run(f"retrieval.search[n={size}]", lambda: catalog.find_similar(next(queries)))
+        shown = [str(i) for i in range(1, 31)]
+        suite.run(f"retrieval.search_excluding[n={size}]",
+                  lambda: catalog.find_similar(next(queries), exclude_ids=shown))
+        batch = [{"id": i, "message": QUERIES[i % len(QUERIES)]} for i in range(100)]
+        suite.run(f"retrieval.match_batch_100[n={size}]", lambda: catalog.match_batch(batch))
+
+
+def bench_language(suite):
+    detect = language._detect_language.__wrapped__
+    for name, text in TEXTS.items():
+        suite.run(f"language.detect[{name}]", lambda text=text: detect(text))
+    suite.run("language.detect_language[memoized]", lambda: language.detect_language(TEXTS["cyrillic_lingua"]))
+
+
+def bench_conversation(suite, turns_list):
+    names = ("facts.mentioned_cold", "facts.mentioned_cached", "history.compact_cold", "prompt.welcome",
+             "prompt.project")
+    if not any(suite.wanted(f"{name}[turns={turns}]") for name in names for turns in turns_list):
+        return
+
+    from agents.welcome_agent import WelcomeAgent
+    from agents.project_agent import ProjectAgent
+
+    welcome = WelcomeAgent()
+    project = ProjectAgent()
+    facts = welcome.fact_matcher.facts or ["We have delivered 300+ projects"]
+    model = "llama3-8b-8192"
+
+    for turns in turns_list:
+        chat = synthetic_history(turns, facts)
+        matcher = FactMatcher(welcome.company_data)
+
+        def facts_cold():
+            matcher._states.clear()
+            matcher.mentioned(chat)
+
+        suite.run(f"facts.mentioned_cold[turns={turns}]", facts_cold)
+        suite.run(f"facts.mentioned_cached[turns={turns}]", lambda: matcher.mentioned(chat))
+
+        def compact_cold():
+            history._summaries.clear()
+            history.compact_history(chat, model, 1500)
+
+        suite.run(f"history.compact_cold[turns={turns}]", compact_cold)
+        suite.run(f"prompt.welcome[turns={turns}]",
+                  lambda: welcome._build_messages("How fast can you launch an MVP?", chat, "en", "client", model))
+        suite.run(f"prompt.project[turns={turns}]",
+                  lambda: project._build_messages(QUERIES[0], chat, [], model))
+
+
+def bench_images(suite):
+    article = synthetic_article()
+    for chunk_chars in (16, 4096):
+        chunks = [article[i:i + chunk_chars] for i in range(0, len(article), chunk_chars)]
+
+        def inject():
+            injector = StreamingImageInjector(InlineExecutor(), lookup=fake_lookup)
+            for chunk in chunks:
+                injector.feed(chunk)
+            return injector.finish()
+
+        suite.run(f"images.inject[chunk={chunk_chars}]", inject)
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks whose median regressed past threshold, with both medians."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result["median_us"] > before["median_us"] * (1 + threshold):
+            regressions.append((name, before["median_us"], result["median_us"]))
+    return regressions
+
+
+def _int_list(spec):
+    return [int(float(item)) for item in spec.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_int_list, default=_int_list(DEFAULT_SIZES),
+                        help=f"synthetic catalog sizes (default: {DEFAULT_SIZES}; 1000000 takes minutes)")
+    parser.add_argument("--turns", type=_int_list, default=_int_list(DEFAULT_TURNS),
+                        help=f"chat history lengths in turns (default: {DEFAULT_TURNS})")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent per benchmark (default: 0.5)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark (default: 5)")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", 0.25)),
+                        help="allowed slowdown of a median versus the baseline (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.min_time, args.repeat, args.only)
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        bench_retrieval(suite, args.sizes, workdir)
+    bench_language(suite)
+    bench_conversation(suite, args.turns)
+    bench_images(suite)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()}",
+        "results": suite.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(suite.results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:", file=sys.stderr)
+            for name, before, after in regressions:
+                print(f"  {name}: {before:,.1f} us -> {after:,.1f} us ({after / before - 1:+.0%})", file=sys.stderr)
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""Local stand-ins for the upstream APIs, for load tests that cost nothing.
+
+One HTTP server answers on every path the backend calls:
+
+    /openai/v1/chat/completions   Groq chat completions, streaming included
+    /ddgs                         web search (DDGS-shaped JSON)
+    /pixabay/api/                 Pixabay photo search
+    /unsplash/search/photos       Unsplash photo search
+
+Each upstream's latency, jitter, error rate and 429 rate are configurable.
+Start the stubs, then the backend with the environment they print:
+
+    python bench/stubs.py --port 9100 --llm-latency 0.8 --llm-429-rate 0.05
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+WORDS = (
+    "design product users growth platform launch brand research interface team "
+    "mobile web performance story market feedback iteration value experience data"
+).split()
+IMAGE_WORDS = ["tech", "team", "office", "city", "nature", "laptop", "health", "money", "people", "travel"]
+
+
+class Upstream:
+    """Behaviour of one stand-in: latency plus jitter, random 5xx and random 429s."""
+
+    def __init__(self, name, latency, jitter, error_rate, rate_limit_rate, retry_after):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def delay(self):
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def outcome(self):
+        """"ok", "error" or "rate_limited" for the next request, counted."""
+        roll = random.random()
+        outcome = "ok"
+        if roll < self.rate_limit_rate:
+            outcome = "rate_limited"
+        elif roll < self.rate_limit_rate + self.error_rate:
+            outcome = "error"
+        with self.lock:
+            self.counts["requests"] += 1
+            if outcome != "ok":
+                self.counts["errors" if outcome == "error" else "rate_limited"] += 1
+        return outcome
+
+
+def _sentence(count):
+    return " ".join(random.choice(WORDS) for _ in range(count)).capitalize() + "."
+
+
+def _completion_text(body):
+    """Plausible output for the prompt: audience label, outline JSON or HTML with image placeholders."""
+    messages = body.get("messages") or [{}]
+    last = messages[-1].get("content") or ""
+    if last.startswith("Classify the user type"):
+        return random.choice(["client", "designer", "developer", "other"])
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps({
+            "title": _sentence(5),
+            "summary": _sentence(40),
+            "sections": [{"title": _sentence(4), "points": [_sentence(6), _sentence(6)]} for _ in range(4)],
+            "conclusion": _sentence(30),
+        })
+    # Roughly honour max_tokens (about 4 characters per token) so long articles stay long.
+    target = min(int(body.get("max_tokens") or 800) * 4, 20000)
+    parts = []
+    length = 0
+    while length < target:
+        if len(parts) % 3 == 2:
+            part = (f"<!--IMAGE_KEYWORDS: {', '.join(random.sample(IMAGE_WORDS, 3))}-->\n"
+                    "<!--IMAGE_HERE-->\n")
+        else:
+            part = f"<p>{_sentence(40)}</p>\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstreams = {}
+    token_interval = 0.0
+    chunk_chars = 16
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, upstream, outcome):
+        """Answer with the failure picked for this request; True if one was sent."""
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                            {"retry-after": str(upstream.retry_after)})
+            return True
+        if outcome == "error":
+            self._send_json(503, {"error": {"message": "Service unavailable"}})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.rstrip("/") == "/ddgs":
+            upstream = self.upstreams["search"]
+        elif url.path.startswith("/pixabay") or url.path.startswith("/unsplash"):
+            upstream = self.upstreams["images"]
+        elif url.path == "/stats":
+            self._send_json(200, {name: dict(u.counts) for name, u in self.upstreams.items()})
+            return
+        else:
+            self._send_json(404, {"error": "unknown path"})
+            return
+
+        upstream.delay()
+        if self._fail(upstream, upstream.outcome()):
+            return
+        if upstream.name == "search":
+            count = int(query.get("max_results", 5))
+            self._send_json(200, [
+                {"title": _sentence(6), "body": _sentence(50), "href": f"https://example.com/{i}"}
+                for i in range(count)
+            ])
+            return
+        per_page = int(query.get("per_page", 5))
+        seed = abs(hash(query.get("q") or query.get("query") or ""))
+        urls = [f"https://images.example.com/{seed}/{i}.jpg" for i in range(per_page)]
+        if url.path.startswith("/pixabay"):
+            self._send_json(200, {"hits": [{"webformatURL": u} for u in urls]})
+        else:
+            self._send_json(200, {"results": [{"urls": {"regular": u}} for u in urls]})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/openai/v1/chat/completions":
+            self._send_json(404, {"error": "unknown path"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        upstream = self.upstreams["llm"]
+
+        started = time.perf_counter()
+        upstream.delay()
+        if self._fail(upstream, upstream.outcome()):
+            return
+        text = _completion_text(body)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        completion_tokens = len(text) // 4
+        headers = {
+            "x-ratelimit-limit-tokens": "1000000",
+            "x-ratelimit-remaining-tokens": "999000",
+        }
+        if body.get("stream"):
+            self._stream(body, text, prompt_tokens, completion_tokens, started, headers)
+            return
+        time.sleep(self.token_interval * completion_tokens / max(1, self.chunk_chars // 4))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "completion_time": time.perf_counter() - started - upstream.latency,
+        }
+        self._send_json(200, {
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }, headers)
+
+    def _stream(self, body, text, prompt_tokens, completion_tokens, started, headers):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def write(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+        model = body.get("model")
+        for i in range(0, len(text), self.chunk_chars):
+            write(json.dumps({"model": model, "choices": [{"index": 0, "delta": {"content": text[i:i + self.chunk_chars]}}]}))
+            if self.token_interval:
+                time.sleep(self.token_interval)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        write(json.dumps({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                          "x_groq": {"usage": usage}}))
+        write("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def build_server(host, port, upstreams, token_interval=0.0, chunk_chars=16):
+    handler = type("Handler", (StubHandler,), {
+        "upstreams": upstreams,
+        "token_interval": token_interval,
+        "chunk_chars": chunk_chars,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable runs")
+    for name, latency in (("llm", 0.5), ("search", 0.3), ("images", 0.2)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help=f"mean seconds (default: {latency})")
+        parser.add_argument(f"--{name}-jitter", type=float, default=latency / 5, help="standard deviation, seconds")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="share of 503 responses")
+        parser.add_argument(f"--{name}-429-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after sent with 429s, seconds")
+    parser.add_argument("--token-interval", type=float, default=0.01,
+                        help="seconds between streamed chunks (default: 0.01)")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed chunk")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    options = vars(args)
+    upstreams = {
+        name: Upstream(
+            name,
+            options[f"{name}_latency"],
+            options[f"{name}_jitter"],
+            options[f"{name}_error_rate"],
+            options[f"{name}_429_rate"],
+            args.retry_after,
+        )
+        for name in ("llm", "search", "images")
+    }
+    server = build_server(args.host, args.port, upstreams, args.token_interval, args.chunk_chars)
+    base = f"http://{args.host}:{args.port}"
+    print("Stand-ins listening; start the backend with:\n")
+    print(f"  GROQ_API_KEY=stub GROQ_API_BASE={base}/openai/v1 \\")
+    print(f"  WEB_SEARCH_URL={base}/ddgs \\")
+    print(f"  PIXABAY_API_KEY=stub PIXABAY_API_BASE={base}/pixabay/api/ \\")
+    print(f"  UNSPLASH_ACCESS_KEY=stub UNSPLASH_API_BASE={base}/unsplash\n")
+    print(f"Request counts: {base}/stats", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""gunicorn settings, read automatically when gunicorn starts in this directory.
+
+The app is preloaded: the master imports main once, building the agents, the
+project index and the language models, and every worker is forked from it and
+shares those pages copy-on-write instead of loading its own copy. Set
+GUNICORN_PRELOAD=0 to have each worker load the app itself (e.g. for
+--reload during development). Workers, bind address and the rest come from
+the usual gunicorn flags and WEB_CONCURRENCY / PORT.
+"""
+import gc
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+if preload_app:
+    # Tells main to warm shared state now and leave worker threads to post_fork.
+    os.environ["GUNICORN_PRELOAD_APP"] = "1"
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so collections
+    # in the workers don't write to (and so copy) the shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Several workers need sessions they can all read (agents.session_store).
+    os.environ["GUNICORN_WORKERS"] = str(server.cfg.workers)
+    if not server.cfg.preload_app:
+        return
+    import main
+    from agents.startup import startup
+
+    startup.after_fork()
+    main.init_worker()
@@ -1,49 +1,305 @@
-from flask import Flask, request, jsonify
+import os
+import hmac
+import json
+import importlib
 from dotenv import load_dotenv
+
+# Before any agents import: the rate limiter, router and caches read their
+# settings from the environment when their modules load.
+load_dotenv()
+
+from agents.startup import startup
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from agents.welcome_agent import WelcomeAgent
 from agents.research_agent import ResearchAgent
 from agents.copywriter_agent import CopywriterAgent
 from agents.project_agent import ProjectAgent
+from agents.session_store import get_session_store, new_session
+from agents.response_cache import response_cache
+from agents.singleflight import single_flight
+from agents.rate_limiter import scheduler
+from agents.model_router import router, served_models
+from agents.history import get_stats as get_history_stats
+from agents.web_search import get_web_search
+from agents.metrics import registry, start_request, HTTP_SECONDS
+from agents.language import warm_up as warm_up_language
+from agents.llm_client import get_llm_client
 
-load_dotenv()
+startup.mark('imports')
 
 app = Flask(__name__)
 CORS(app)
 
 welcome_agent = WelcomeAgent()
+startup.mark('welcome_agent')
 research_agent = ResearchAgent()
+startup.mark('research_agent')
 copywriter_agent = CopywriterAgent()
+startup.mark('copywriter_agent')
 project_agent = ProjectAgent()
+startup.mark('project_agent')
+session_store = get_session_store()
+
+
+def init_worker():
+    """Per-process setup that must not run before a fork: background threads."""
+    project_agent.watch_projects(float(os.getenv('PROJECT_RELOAD_INTERVAL', 5)))
+
+
+if os.getenv('GUNICORN_PRELOAD_APP'):
+    # Loaded once in the gunicorn master (see gunicorn.conf.py). Build the
+    # read-only state that would otherwise load lazily in every worker, so the
+    # forked workers share its pages; gunicorn calls init_worker() after forking.
+    warm_up_language()
+    startup.mark('language_models')
+    importlib.import_module('ddgs')
+    startup.mark('ddgs')
+else:
+    init_worker()
+startup.loaded()
+
+MAX_MATCH_TOP_N = 50
+
+LENGTH_MAPPING = {
+    'short': 2000,
+    'medium': 5000,
+    'long': 10000
+}
+
+
+def _agent_for_path(path):
+    """Metrics label for a request path: the agent for /api/<agent>/..., else "other"."""
+    parts = path.strip('/').split('/')
+    if len(parts) >= 2 and parts[0] == 'api':
+        return parts[1]
+    return 'other'
+
+
+@app.before_request
+def _start_timing():
+    g.timing = start_request(_agent_for_path(request.path))
+
+
+@app.after_request
+def _add_server_timing(response):
+    """Attach the request's stage breakdown as Server-Timing and record its latency.
+
+    Streaming responses are timed up to their headers; the stages they run
+    afterwards still reach the stage histograms.
+    """
+    timing = g.get('timing')
+    if timing is not None:
+        response.headers['Server-Timing'] = timing.header()
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_SECONDS.observe(timing.elapsed(), endpoint=endpoint, method=request.method,
+                             status=response.status_code)
+    return response
+
+
+def _collect_agent_stats():
+    """Scrape-time samples from the caches, coalescing, rate limiter and router."""
+    cache = response_cache.stats()
+    flights = single_flight.stats()
+    limits = scheduler.stats()
+    routes = router.stats()
+    history = get_history_stats()
+    namespaces = cache['namespaces'].items()
+    return [
+        ('llm_cache_hits_total', 'counter', 'Completions served from the response cache.',
+         [({'namespace': ns}, counts['hits']) for ns, counts in namespaces]),
+        ('llm_cache_misses_total', 'counter', 'Response cache lookups that went upstream.',
+         [({'namespace': ns}, counts['misses']) for ns, counts in namespaces]),
+        ('llm_cache_entries', 'gauge', 'Completions held in the response cache.',
+         [({}, cache['entries'])]),
+        ('single_flight_calls_total', 'counter', 'Calls seen by request coalescing.',
+         [({}, flights['calls'])]),
+        ('single_flight_shared_total', 'counter', 'Calls that joined an identical in-flight call.',
+         [({}, flights['shared'])]),
+        ('llm_rate_limit_events_total', 'counter', 'Rate-limit scheduler events.',
+         [({'event': event}, limits[event]) for event in ('admitted', 'waited', 'rate_limited', 'timeouts')]),
+        ('llm_rate_limit_wait_seconds_total', 'counter', 'Time calls spent queued for capacity.',
+         [({}, limits['wait_ms'] / 1000)]),
+        ('llm_failovers_total', 'counter', 'Calls retried on a fallback model.',
+         [({}, routes['failovers'])]),
+        ('llm_model_latency_ewma_seconds', 'gauge', 'Moving average of provider overhead per model.',
+         [({'model': model}, health['latency_ms'] / 1000) for model, health in routes['models'].items()]),
+        ('llm_model_error_rate_ewma', 'gauge', 'Moving average of the error rate per model.',
+         [({'model': model}, health['error_rate']) for model, health in routes['models'].items()]),
+        ('history_compacted_requests_total', 'counter', 'Requests whose chat history was compacted.',
+         [({}, history.get('compacted', 0))]),
+        ('history_tokens_saved_total', 'counter', 'Prompt tokens removed by history compaction.',
+         [({}, history.get('tokens_saved', 0))]),
+    ]
+
+
+registry.add_collector(_collect_agent_stats)
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class UnknownSession(Exception):
+    """A session_id the store doesn't have: expired, or held in another worker's memory."""
+
+
+@app.errorhandler(UnknownSession)
+def _unknown_session(e):
+    return jsonify({'error': 'Unknown or expired session', 'session_expired': True, 'session_id': str(e)}), 409
+
+
+def _open_session(agent, data):
+    """Return (session_id, session) for a request.
+
+    With a session_id the conversation continues from server-side state and
+    the client only sends the new message. An explicit chat_history (clients
+    that keep history themselves) replaces the stored one. An unknown
+    session_id without a chat_history raises UnknownSession (a 409), so the
+    client can resend its history instead of silently starting over.
+    """
+    session_id = data.get('session_id')
+    session = session_store.get(agent, session_id) if session_id else None
+    if session is None:
+        if session_id and data.get('chat_history') is None:
+            raise UnknownSession(session_id)
+        session_id, session = session_id or session_store.new_id(), new_session()
+    session['replaced'] = []
+    for field in ('chat_history', 'shown_project_ids'):
+        if data.get(field) is not None:
+            key = 'history' if field == 'chat_history' else field
+            session[key] = data.get(field) or []
+            session['replaced'].append(key)
+    return session_id, session
+
+
+def _save_turn(agent, session_id, session, message, response, project_ids=None):
+    """Append the turn to the stored session.
+
+    The append is applied to the session as stored at save time, so a turn
+    of the same session that finished in the meantime is kept; only fields
+    the client sent explicitly replace the stored ones.
+    """
+    def apply(stored):
+        for key in session.get('replaced', ()):
+            stored[key] = session[key]
+        for key in ('lang', 'audience'):
+            if session.get(key):
+                stored[key] = session[key]
+        stored['history'] = stored.get('history', []) + [
+            {'role': 'user', 'content': message},
+            {'role': 'assistant', 'content': response},
+        ]
+        if project_ids:
+            shown = stored.get('shown_project_ids', [])
+            stored['shown_project_ids'] = shown + [i for i in project_ids if i not in shown]
+        return stored
+
+    session_store.update(agent, session_id, apply)
+
+
+def _served_model(served, requested):
+    """The model that produced the answer: the last one that served a call, else the one asked for."""
+    return served[-1] if served else requested
+
+
+def _session_events(events, agent, session_id, session, message, model=None):
+    """Pass a stream through, saving the turn and adding session_id and the serving model to the done event."""
+    tokens = []
+    with served_models() as served:
+        for event, data in events:
+            if event == 'token':
+                tokens.append(data)
+            elif event == 'done':
+                data = dict(data, session_id=session_id, model=_served_model(served, model))
+                _save_turn(agent, session_id, session, message,
+                           data.get('response') or "".join(tokens), data.get('project_ids'))
+            yield event, data
+
+
+def _sse_response(events):
+    """Forward (event, data) pairs from an agent stream as Server-Sent Events.
+
+    Tokens are sent as `token` events with {"content": ...}; the stream ends
+    with a single `done` (metadata such as project_ids) or `error` event.
+    """
+    def generate():
+        # Flush headers right away; agents may still be searching or retrieving.
+        yield ": stream open\n\n"
+        try:
+            for event, data in events:
+                if event == 'token':
+                    data = {'content': data}
+                yield _sse_event(event, data)
+        except Exception as e:
+            app.logger.error(f"Stream failed: {e}")
+            yield _sse_event('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/welcome', methods=['POST'])
 def handle_welcome():
     data = request.json
     user_message = data.get('message', '').strip()
     model = data.get('model', 'llama3-8b-8192')
-    chat_history = data.get('chat_history', [])
+    session_id, session = _open_session('welcome', data)
+    
+    with served_models() as served:
+        response = welcome_agent.get_response(
+            query=user_message,
+            model=model,
+            chat_history=session['history'],
+            session=session
+        )
+    _save_turn('welcome', session_id, session, user_message, response)
     
-    response = welcome_agent.get_response(
+    return jsonify({'response': response, 'model': _served_model(served, model), 'session_id': session_id})
+
+@app.route('/api/welcome/stream', methods=['POST'])
+def handle_welcome_stream():
+    data = request.json
+    user_message = data.get('message', '').strip()
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = _open_session('welcome', data)
+
+    return _sse_response(_session_events(welcome_agent.stream_response(
         query=user_message,
         model=model,
-        chat_history=chat_history
-    )
-    
-    return jsonify({'response': response})
+        chat_history=session['history'],
+        session=session
+    ), 'welcome', session_id, session, user_message, model))
 
 @app.route('/api/research', methods=['POST'])
 def research_agent_endpoint():
     data = request.json
     message = data.get('message', '')
     model = data.get('model', 'llama3-8b-8192')
-    chat_history = data.get('chat_history', [])
+    session_id, session = _open_session('research', data)
 
-    response = research_agent.search_web(
-        message, 
-        model=model,
-        chat_history=chat_history)
+    with served_models() as served:
+        response = research_agent.search_web(
+            message, 
+            model=model,
+            chat_history=session['history'])
+    _save_turn('research', session_id, session, message, response)
     
-    return jsonify({'response': response})
+    return jsonify({'response': response, 'model': _served_model(served, model), 'session_id': session_id})
+
+@app.route('/api/research/stream', methods=['POST'])
+def research_agent_stream_endpoint():
+    data = request.json
+    message = data.get('message', '')
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = _open_session('research', data)
+
+    return _sse_response(_session_events(research_agent.stream_search_web(
+        message,
+        model=model,
+        chat_history=session['history']), 'research', session_id, session, message, model))
 
 @app.route('/api/copywriter', methods=['POST'])
 def copywriter_agent_endpoint():
@@ -51,55 +307,198 @@ def copywriter_agent_endpoint():
         data = request.json
         message = data.get('message', '').strip()
         length = data.get('length', 'medium')
-        length_mapping = {
-            'short': 2000,
-            'medium': 5000,
-            'long': 10000
-        }
-        length_chars = length_mapping.get(length, 5000)
+        length_chars = LENGTH_MAPPING.get(length, 5000)
         tone = data.get('tone', 'neutral')
         audience = data.get('audience', 'general public')
-        chat_history = data.get('chat_history', [])
+        model = data.get('model') or copywriter_agent.default_model
 
         if len(message) < 15:
             return jsonify({'error': 'Topic must be at least 15 characters'}), 400
 
-        html_content = copywriter_agent.write_article(
-            topic=message,
-            length=length_chars,
-            tone=tone,
-            audience=audience,
-            chat_history=chat_history
-        )
+        session_id, session = _open_session('copywriter', data)
+        with served_models() as served:
+            html_content = copywriter_agent.write_article(
+                topic=message,
+                length=length_chars,
+                tone=tone,
+                audience=audience,
+                chat_history=session['history'],
+                model=model,
+                mode=data.get('mode'),
+                section_length=data.get('section_length')
+            )
 
         if len(html_content) < length_chars * 0.5:
             app.logger.warning(f"Short article generated: {len(html_content)}/{length_chars} chars")
+        _save_turn('copywriter', session_id, session, message, html_content)
 
-        return jsonify({'response': html_content})
+        return jsonify({'response': html_content, 'model': _served_model(served, model), 'session_id': session_id})
 
+    except UnknownSession:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/copywriter/stream', methods=['POST'])
+def copywriter_agent_stream_endpoint():
+    data = request.json
+    message = data.get('message', '').strip()
+    length_chars = LENGTH_MAPPING.get(data.get('length', 'medium'), 5000)
+    model = data.get('model') or copywriter_agent.default_model
+
+    if len(message) < 15:
+        return jsonify({'error': 'Topic must be at least 15 characters'}), 400
+
+    session_id, session = _open_session('copywriter', data)
+    return _sse_response(_session_events(copywriter_agent.stream_article(
+        topic=message,
+        length=length_chars,
+        tone=data.get('tone', 'neutral'),
+        audience=data.get('audience', 'general public'),
+        chat_history=session['history'],
+        model=model,
+        mode=data.get('mode'),
+        section_length=data.get('section_length')
+    ), 'copywriter', session_id, session, message, model))
+
 @app.route('/api/project', methods=['POST'])
 def handle_project():
     data = request.json
     user_message = data.get('message', '').strip()
     model = data.get('model', 'llama3-8b-8192')
-    chat_history = data.get('chat_history', [])
-    shown_project_ids = data.get('shown_project_ids', [])
+    session_id, session = _open_session('project', data)
 
-    result = project_agent.get_response(
-        query=user_message,
-        model=model,
-        chat_history=chat_history,
-        shown_project_ids=shown_project_ids
-    )
+    with served_models() as served:
+        result = project_agent.get_response(
+            query=user_message,
+            model=model,
+            chat_history=session['history'],
+            shown_project_ids=session['shown_project_ids']
+        )
+    _save_turn('project', session_id, session, user_message, result["text"], result.get("project_ids"))
 
     return jsonify({
         'response': result["text"],
-        'project_ids': result.get("project_ids", [])
+        'project_ids': result.get("project_ids", []),
+        'model': _served_model(served, model),
+        'session_id': session_id
+    })
+
+@app.route('/api/project/match', methods=['POST'])
+def handle_project_match():
+    """Retrieval-only batch matching for many leads.
+
+    Body: {"queries": [{"id", "message", "exclude_ids"}, ...], "top_n": 3},
+    or the queries as JSON Lines. Responds with one JSON line per query.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        queries = data.get('queries', [])
+        top_n = data.get('top_n', 3)
+    else:
+        queries = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                queries.append(json.loads(line))
+            except ValueError as e:
+                return jsonify({'error': f'Line {number} is not valid JSON: {e}'}), 400
+        top_n = request.args.get('top_n', 3)
+
+    if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+        return jsonify({'error': 'queries must be a list of objects'}), 400
+    try:
+        top_n = max(1, min(int(top_n), MAX_MATCH_TOP_N))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_n must be an integer'}), 400
+
+    matches = project_agent.match_projects(queries, top_n=top_n)
+    body = "".join(json.dumps(match, ensure_ascii=False) + "\n" for match in matches)
+    return Response(body, mimetype='application/x-ndjson')
+
+def _admin_error():
+    """Error response unless the request carries the ADMIN_TOKEN, else None."""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Admin endpoints are disabled'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+@app.route('/api/admin/reload-projects', methods=['POST'])
+def handle_reload_projects():
+    """Reload projects.json in this worker without a restart (needs ADMIN_TOKEN)."""
+    error = _admin_error()
+    if error:
+        return error
+
+    try:
+        stats = project_agent.reload_projects()
+    except Exception as e:
+        app.logger.error(f"Project reload failed: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(stats)
+
+@app.route('/api/admin/stats', methods=['GET'])
+def handle_admin_stats():
+    """Response cache, request coalescing, rate limiting, model routing, history and search counters for this worker."""
+    error = _admin_error()
+    if error:
+        return error
+    return jsonify({
+        'response_cache': response_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'rate_limiter': scheduler.stats(),
+        'router': router.stats(),
+        'history': get_history_stats(),
+        'web_search': get_web_search().stats()
     })
 
+def readiness_report():
+    """Open this worker's LLM connection pool on the first call, then report startup timing."""
+    startup.warm('llm_pool', get_llm_client().warm)
+    return {
+        'ready': True,
+        'projects': len(project_agent.projects),
+        'startup': startup.report(),
+    }
+
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness probe for load balancers and autoscalers.
+
+    Warm-up failures are reported but don't fail the probe: an unreachable
+    provider affects every instance alike.
+    """
+    return jsonify(readiness_report())
+
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """Prometheus metrics for this worker process."""
+    token = os.getenv('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/project/stream', methods=['POST'])
+def handle_project_stream():
+    data = request.json
+    user_message = data.get('message', '').strip()
+    model = data.get('model', 'llama3-8b-8192')
+    session_id, session = _open_session('project', data)
+
+    return _sse_response(_session_events(project_agent.stream_response(
+        query=user_message,
+        model=model,
+        chat_history=session['history'],
+        shown_project_ids=session['shown_project_ids']
+    ), 'project', session_id, session, user_message, model))
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,62 @@
+"""Match leads to case studies from the command line, without calling the LLM.
+
+Input is JSON Lines, one lead per line: {"id": ..., "message": ..., "exclude_ids": [...]}
+(a plain text line is treated as the message). Output is one JSON line per lead
+with ranked "project_ids" and "scores".
+
+    python match_projects.py leads.jsonl -o matches.jsonl --top-n 5
+    cat leads.txt | python match_projects.py > matches.jsonl
+"""
+import sys
+import json
+import time
+import argparse
+from agents.project_catalog import ProjectCatalog
+
+
+def read_queries(stream):
+    queries = []
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            queries.append(json.loads(line))
+        else:
+            queries.append({"id": number, "message": line})
+    return queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="JSON Lines file with leads (default: stdin)")
+    parser.add_argument("-o", "--output", help="where to write matches (default: stdout)")
+    parser.add_argument("--top-n", type=int, default=3, help="projects per lead (default: 3)")
+    args = parser.parse_args(argv)
+
+    catalog = ProjectCatalog()
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            queries = read_queries(f)
+    else:
+        queries = read_queries(sys.stdin)
+
+    started = time.perf_counter()
+    matches = catalog.match_batch(queries, top_n=args.top_n)
+    elapsed = time.perf_counter() - started
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for match in matches:
+            out.write(json.dumps(match, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    rate = len(queries) / elapsed if elapsed else float("inf")
+    print(f"Matched {len(queries)} queries in {elapsed:.3f}s ({rate:,.0f} queries/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from agents.copywriter_agent import CopywriterAgent, FRAME_SHARE
+
+
+@pytest.fixture(scope="module")
+def agent():
+    return CopywriterAgent()
+
+
+@pytest.mark.parametrize("length, section_length", [
+    (2000, None),     # short article: two sections of the default size would overshoot
+    (2000, 4000),
+    (10000, 300),     # long article, tiny sections: capped at 8 sections
+    (10000, None),
+    (5000, 1500),
+])
+def test_section_plan_adds_up_to_the_requested_length(agent, length, section_length):
+    count, per_section = agent._section_plan(length, section_length)
+
+    planned = count * per_section + length * FRAME_SHARE
+    assert 2 <= count <= 8
+    assert abs(planned - length) <= 0.02 * length
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from agents.project_catalog import ProjectCatalog
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    return ProjectCatalog(index_root=tmp_path_factory.mktemp("index"))
+
+
+def test_match_batch_rejects_unhashable_exclude_ids(catalog):
+    matches = catalog.match_batch([
+        {"id": "bad", "message": "fintech app", "exclude_ids": [[1]]},
+        {"id": "good", "message": "fintech app", "exclude_ids": ["1"]},
+    ])
+
+    assert matches[0] == {
+        "id": "bad", "project_ids": [], "scores": [], "error": "exclude_ids must be a list of project ids",
+    }
+    assert "error" not in matches[1]
+    assert matches[1]["project_ids"] and "1" not in matches[1]["project_ids"]
+
+
+def test_match_endpoint_keeps_the_batch_on_a_nested_list_id():
+    import main
+
+    response = main.app.test_client().post("/api/project/match", json={"queries": [
+        {"id": 1, "message": "e-commerce redesign", "exclude_ids": [[1]]},
+        {"id": 2, "message": "e-commerce redesign", "exclude_ids": [True]},
+        {"id": 3, "message": "e-commerce redesign"},
+    ]})
+
+    assert response.status_code == 200
+    lines = [line for line in response.get_data(as_text=True).splitlines() if line]
+    assert len(lines) == 3
+    assert '"error"' in lines[0] and '"error"' in lines[1] and '"error"' not in lines[2]
@@ -50,6 +50,7 @@ export default function AgentSection({ agentType }) {
     if (prevModelRef.current !== model || prevAgentTypeRef.current !== agentType) {
       setMessages([]);
       localStorage.removeItem(`${agentType}_history`);
+      localStorage.removeItem(`${agentType}_session`);
     }
     prevModelRef.current = model;
     prevAgentTypeRef.current = agentType;
@@ -71,17 +72,10 @@ export default function AgentSection({ agentType }) {
 
     setIsLoading(true);
 
-    let shownProjectIds = [];
+    // History and shown projects are kept server-side under the session id.
+    const sessionId = localStorage.getItem(`${agentType}_session`);
 
-    if (agentType === "project") {
-      for (const msg of messages) {
-        if (msg.role === "agent" && Array.isArray(msg.projectIds)) {
-          shownProjectIds.push(...msg.projectIds);
-        }
-      }
-    }
-
-    const body =
+    const buildBody = (session) =>
       agentType === "copywriter"
         ? {
             message: trimmed,
@@ -89,32 +83,52 @@ export default function AgentSection({ agentType }) {
             length,
             tone,
             audience,
-            chat_history: messages.map((msg) => ({
-              role: msg.role === "agent" ? "assistant" : "user",
-              content: msg.text,
-            })),
+            ...session,
             stream: true,
           }
         : {
             message: trimmed,
             model,
-            chat_history: messages.map((msg) => ({
-              role: msg.role === "agent" ? "assistant" : "user",
-              content: msg.text,
-            })),
-            ...(agentType === "project" && {
-              shown_project_ids: shownProjectIds,
-            }),
+            ...session,
           };
 
-    try {
-      const res = await fetch(`${apiUrl}/api/${agentType}`, {
+    // Sent only when the server no longer knows the session (expired, or
+    // kept by another worker), so the conversation continues where it was.
+    const restoreSession = () => {
+      const shownProjectIds = messages.flatMap((msg) =>
+        msg.role === "agent" && Array.isArray(msg.projectIds) ? msg.projectIds : []
+      );
+      return {
+        chat_history: messages
+          .filter((msg) => msg.role !== "error")
+          .map((msg) => ({
+            role: msg.role === "agent" ? "assistant" : "user",
+            content: msg.text,
+          })),
+        ...(agentType === "project" && { shown_project_ids: shownProjectIds }),
+      };
+    };
+
+    const post = (body) =>
+      fetch(`${apiUrl}/api/${agentType}`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(body),
       });
 
-      const data = await res.json();
+    try {
+      let res = await post(buildBody({ session_id: sessionId }));
+      let data = await res.json();
+
+      if (res.status === 409 && data?.session_expired) {
+        localStorage.removeItem(`${agentType}_session`);
+        res = await post(buildBody(restoreSession()));
+        data = await res.json();
+      }
+
+      if (data?.session_id) {
+        localStorage.setItem(`${agentType}_session`, data.session_id);
+      }
 
       if (data?.response) {
         const userMessage = { role: "user", text: trimmed };
@@ -149,6 +163,7 @@ export default function AgentSection({ agentType }) {
   const handleNewChat = () => {
     setMessages([]);
     localStorage.removeItem(`${agentType}_history`);
+    localStorage.removeItem(`${agentType}_session`);
   };
 
   const handleCopy = () => {